@@ -7,15 +7,19 @@ shit to think about:
 
 
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import aiohttp
+from aiolimiter import AsyncLimiter
 from openai import OpenAI
 import json
 from datetime import datetime
 from collections import defaultdict
 from flask_cors import CORS
-import re
-import time
+import difflib
 from ratelimit import limits, sleep_and_retry
 from dotenv import load_dotenv
 import os
@@ -31,78 +35,87 @@ BALLDONTLIE_API_KEY = os.getenv("BALLDONTLIE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 HEADERS = {"Authorization": f"Bearer {BALLDONTLIE_API_KEY}"}
 BASE_URL = "https://api.balldontlie.io/v1"
-# Cache for team data
-team_cache = {}
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# Initialize RAG Agent
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-rag_agent = NBARAGAgent(MONGODB_URI, OPENAI_API_KEY)
-
-REQUESTS_PER_MINUTE = 60  # Adjust as needed
-
-#comment
-@sleep_and_retry
-@limits(calls=REQUESTS_PER_MINUTE, period=60)
-
-def call_bdl_api(url, params=None, headers=None, **kwargs):
-    response = requests.get(url, params=params, headers=headers, **kwargs)
-
-    if response.status_code == 429:
-        raise Exception("Rate limit exceeded.")
-
-    return response
-def extract_json(text):
-    match = re.search(r"```(?:json)?\s*(\{.*\})\s*```", text, re.DOTALL)
-    if match:
-        return match.group(1)
-    return text
-
-def interpret_query_with_ai(query):
-    prompt = f'''Analyze this NBA team wins query and return JSON with:
+# Static instructions for interpret_query_with_ai (constant, so OpenAI can cache the prompt prefix)
+QUERY_INSTRUCTIONS = '''Analyze the user's NBA team wins query and return JSON with:
 - team_names (array of strings)
 - seasons (array of years)
 - comparison_type ("standalone", "team_comparison", "league_average")
 - visualization_type ("bar", "line", "pie") judge based on the query which visualization is most appropriate, unless specified in the query.
 
-Query: {query}
-
 Examples:
-1. "Lakers wins in 2020" → {{
+1. "Lakers wins in 2020" → {
     "team_names": ["Los Angeles Lakers"],
     "seasons": [2020],
     "comparison_type": "standalone"
-}}
-2. "Compare Celtics and Warriors 2015-2023" → {{
+}
+2. "Compare Celtics and Warriors 2015-2023" → {
     "team_names": ["Boston Celtics", "Golden State Warriors"],
     "seasons": [2015,2023],
     "comparison_type": "team_comparison",
-}}
+}
 
 Convert all team names to full names as used in the API, e.g. "Los Angeles Lakers" instead of "Lakers".
 
 Return ONLY valid JSON in the following format:
-{{
+{
   "team_names": [...],
   "seasons": [...],
   "comparison_type": "...",
   "visualization_type": "..."
-}}
+}
 '''
 
+# Team IDs keyed by lowercase full name, nickname and abbreviation
+TEAM_ID_BY_NAME = {}
+# Cache of completed seasons' games, keyed by season
+season_games_cache = {}
 
+client = OpenAI(api_key=OPENAI_API_KEY)
+
+# Initialize RAG Agent
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
+rag_agent = NBARAGAgent(MONGODB_URI, OPENAI_API_KEY)
+
+REQUESTS_PER_MINUTE = 60  # Adjust as needed
+# Upper bound on /games pages per fetch (a full season is ~13 pages of 100)
+MAX_GAME_PAGES = 50
+
+# Pooled keep-alive session for synchronous BallDontLie calls, with retry/backoff
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+))
+
+#comment
+@sleep_and_retry
+@limits(calls=REQUESTS_PER_MINUTE, period=60)
+
+def call_bdl_api(url, params=None, headers=None, **kwargs):
+    response = SESSION.get(url, params=params, headers=headers, **kwargs)
+
+    if response.status_code == 429:
+        raise Exception("Rate limit exceeded.")
+
+    return response
+def interpret_query_with_ai(query):
     try:
         response = client.chat.completions.create(
-            model="gpt-4o",
-            messages= [{"role": "user", "content": prompt}],
+            model="gpt-4o-mini",
+            messages= [
+                {"role": "system", "content": QUERY_INSTRUCTIONS},
+                {"role": "user", "content": f"Query: {query}"}
+            ],
             temperature=0.3,
+            max_tokens=200,
+            response_format={"type": "json_object"},
         )   
         raw_content = response.choices[0].message.content
         print("raw", repr(raw_content))
-        cleaned = extract_json(raw_content)
         try:
-            return json.loads(cleaned)
+            return json.loads(raw_content)
         except json.JSONDecodeError as e:
             print("Json decode error:", e)
             return {
@@ -118,112 +131,160 @@ Return ONLY valid JSON in the following format:
         print("Error interpreting query:", e)
         return {"error": str(e)}
 
+def _populate_team_index():
+    """Fetch /teams once and index team IDs by name"""
+    try:
+        response = call_bdl_api(f"{BASE_URL}/teams", headers=HEADERS)
+        teams = response.json()['data']
+    except Exception as e:
+        print("Error loading teams:", e)
+        return
+
+    # Current franchises come first in /teams; keep them over defunct teams with the same name
+    for team in teams:
+        for alias in (team['abbreviation'], team['name'], team['full_name']):
+            TEAM_ID_BY_NAME.setdefault(alias.lower(), team['id'])
+
 def get_team_id(team_name):
-    """Get team ID from name with caching"""
-    if team_name in team_cache:
-        return team_cache[team_name]
-    
-    response = call_bdl_api(f"{BASE_URL}/teams", headers=HEADERS)
-    for team in response.json()['data']:
-        team_cache[team['full_name']] = team['id']
-        if team_name.lower() in team['full_name'].lower():
-            return team['id']
+    """Get team ID from name"""
+    if not TEAM_ID_BY_NAME:
+        _populate_team_index()
+
+    key = team_name.lower()
+    if key in TEAM_ID_BY_NAME:
+        return TEAM_ID_BY_NAME[key]
+
+    matches = difflib.get_close_matches(key, TEAM_ID_BY_NAME.keys(), n=1)
+    return TEAM_ID_BY_NAME[matches[0]] if matches else None
+
+_populate_team_index()
+
+def bdl_session():
+    """Create an aiohttp session for concurrent BallDontLie requests"""
+    return aiohttp.ClientSession(headers=HEADERS, connector=aiohttp.TCPConnector(limit=10))
+
+async def fetch_games(session, limiter, params, cursor=None):
+    """Fetch a single page of /games, retrying when rate limited"""
+    page_params = {**params, 'cursor': cursor} if cursor is not None else params
+
+    # Retry logic (max 3 attempts), one request per attempt
+    for attempt in range(3):
+        async with limiter:
+            async with session.get(f"{BASE_URL}/games", params=page_params) as response:
+                if response.status != 429:
+                    if response.status != 200:
+                        print(f"Failed to get games for {params} (cursor {cursor}): {response.status}")
+                        return None
+                    try:
+                        return await response.json()
+                    except Exception as e:
+                        print(f"JSON decode error for {params} cursor {cursor}: {e}")
+                        return None
+
+        # Back off only between attempts, after the connection is released
+        print(f"Rate limited on cursor {cursor} ({attempt+1}/3)")
+        if attempt < 2:
+            await asyncio.sleep(2)
+
+    print(f"Giving up on cursor {cursor} of {params} after 3 rate-limited attempts")
     return None
 
-def get_team_wins(team_id, season):
-    """Calculate regular season wins for a team"""
-    params = {
-        'seasons[]': season,
-        'team_ids[]': team_id,
-        'per_page': 100
-    }
-    
+async def fetch_all_games(session, limiter, params):
+    """
+    Fetch every page of /games by following meta.next_cursor.
+    Returns (games, complete); complete is False if a page failed or the page cap was hit.
+    """
+    games_by_id = {}
+    cursor = None
+
+    for _ in range(MAX_GAME_PAGES):
+        data = await fetch_games(session, limiter, params, cursor)
+        if not data:
+            return list(games_by_id.values()), False
+        for game in data.get('data', []):
+            games_by_id[game['id']] = game
+        cursor = data.get('meta', {}).get('next_cursor')
+        if cursor is None:
+            return list(games_by_id.values()), True
+
+    print(f"Stopped after {MAX_GAME_PAGES} pages of games for {params}")
+    return list(games_by_id.values()), False
+
+def count_team_wins(games, team_id):
+    """Count regular season wins for a team in a list of games"""
     wins = 0
-    page = 1
-
-    while True:
-        time.sleep(1.1) # Rate limit handling
-        response = call_bdl_api(f"{BASE_URL}/games", headers=HEADERS, params=params)
-        params['page'] = page
-
-        # Retry logic (max 3 attempts)
-        for attempt in range(3):
-            time.sleep(2)  # backoff before retry
-            params['page'] = page  # Reset page for retry
-            response = call_bdl_api(f"{BASE_URL}/games", headers=HEADERS, params=params)
-
-            if response.status_code == 429:
-                print(f"Rate limited on season {season}, page {page}, retrying ({attempt+1}/3)...")
-                time.sleep(2)  # backoff before retry
-                continue
-            elif response.status_code != 200:
-                print(f"Failed to get games for team {team_id} in season {season} (page {page}): {response.status_code}")
-                return wins
-            else:
-                break  
-
-        try:
-            games = response.json()['data']
-        except Exception as e:
-            print(f"JSON decode error on team {team_id} season {season} page {page}: {e}")
-            return wins
-
-        # Process game data
-        for game in games:
-            if game['postseason']:
-                continue
-            if game['home_team']['id'] == team_id:
-                wins += 1 if game['home_team_score'] > game['visitor_team_score'] else 0
-            else:
-                wins += 1 if game['visitor_team_score'] > game['home_team_score'] else 0
+    for game in games:
+        if game['postseason']:
+            continue
+        if game['home_team']['id'] == team_id:
+            wins += 1 if game['home_team_score'] > game['visitor_team_score'] else 0
+        elif game['visitor_team']['id'] == team_id:
+            wins += 1 if game['visitor_team_score'] > game['home_team_score'] else 0
+    return wins
 
-        # Stop condition — no more data
-        if len(games) < 100:
-            break
-        page += 1
+def league_avg_wins(games):
+    """Average regular season wins per team in a list of games"""
+    team_wins = defaultdict(int)
+    for game in games:
+        if game['postseason']:
+            continue
+        home_id = game['home_team']['id']
+        visitor_id = game['visitor_team']['id']
+        home_won = game['home_team_score'] > game['visitor_team_score']
+        team_wins[home_id] += 1 if home_won else 0
+        team_wins[visitor_id] += 0 if home_won else 1
 
-    print(f"Wins for team ID {team_id} in {season}: {wins}")
-    return wins
+    return sum(team_wins.values()) / len(team_wins) if team_wins else 0
 
+async def fetch_season_games(session, limiter, season):
+    """Fetch every game in a season once, caching seasons that are complete"""
+    if season in season_games_cache:
+        return season_games_cache[season]
 
-def get_league_avg_wins(season):
-    """Calculate average wins across all teams"""
-    team_wins = defaultdict(int)
     params = {
         'seasons[]': season,
-        'per_page': 100,
-        'page': 1
+        'per_page': 100
     }
+    games, complete = await fetch_all_games(session, limiter, params)
+    if not games:
+        print(f"No games returned for season {season}")
+    elif complete and all(game.get('status') == 'Final' for game in games):
+        # Only a full fetch of a finished season is safe to keep for the process's lifetime
+        season_games_cache[season] = games
+    return games
+
+async def fetch_seasons(seasons):
+    """Fetch the games for several seasons concurrently"""
+    limiter = AsyncLimiter(REQUESTS_PER_MINUTE, 60)
+    async with bdl_session() as session:
+        results = await asyncio.gather(*(
+            fetch_season_games(session, limiter, season) for season in seasons
+        ))
+    return dict(zip(seasons, results))
+
+def get_season_games(season):
+    """Get every game in a season, league-wide"""
+    return asyncio.run(fetch_seasons([season]))[season]
+
+def get_team_wins(team_id, season, games=None):
+    """Calculate regular season wins for a team"""
+    if games is None:
+        games = get_season_games(season)
+    wins = count_team_wins(games, team_id)
+    print(f"Wins for team ID {team_id} in {season}: {wins}")
+    return wins
 
-    while True:
-        response = call_bdl_api(f"{BASE_URL}/games", headers=HEADERS, params=params)
-
-        try:
-            data = response.json()
-        except Exception as e:
-            print("JSON decode error:", e)
-            break
-
-        games = data.get('data', [])
-        if not games:
-            print(f"No games returned for season {season}, page {params['page']}")
-            break
-
-        for game in games:
-            if game['postseason']:
-                continue
-            home_id = game['home_team']['id']
-            visitor_id = game['visitor_team']['id']
-            home_won = game['home_team_score'] > game['visitor_team_score']
-            team_wins[home_id] += 1 if home_won else 0
-            team_wins[visitor_id] += 0 if home_won else 1
-
-        if len(games) < 100:
-            break
 
-        params['page'] += 1
+def get_league_avg_wins(season, games=None):
+    """Calculate average wins across all teams"""
+    if games is None:
+        games = get_season_games(season)
+    return league_avg_wins(games)
 
-    return sum(team_wins.values()) / len(team_wins) if team_wins else 0
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Cheap liveness check (also used to warm up client connections)"""
+    return jsonify({"status": "ok", "rag_initialized": rag_agent.is_initialized})
 
 @app.route('/api/rag-analyze', methods=['POST'])
 def rag_analyze():
@@ -242,6 +303,17 @@ def rag_analyze():
             print("Initializing RAG agent...")
             rag_agent.initialize()
         
+        # Stream the analysis as server-sent events when requested
+        if data.get('stream'):
+            def events():
+                try:
+                    for event in rag_agent.analyze_stream(query):
+                        yield f"data: {json.dumps(event)}\n\n"
+                except Exception as e:
+                    print(f"RAG Analysis error: {str(e)}")
+                    yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+            return Response(stream_with_context(events()), mimetype='text/event-stream')
+        
         # Perform RAG analysis
         result = rag_agent.analyze(query)
         
@@ -266,6 +338,17 @@ def analyze_team_wins():
             "league_averages": {}
         }
         
+        seasons = list(range(analysis['seasons'][0], analysis['seasons'][-1] + 1))
+
+        season_range = []
+        if analysis['comparison_type'] == 'league_average':
+            season_range = sorted(set(analysis['seasons']))
+            if len(season_range) == 2 and season_range[1] - season_range[0] >=1:
+                season_range = list(range(season_range[0], season_range[1] + 1))
+
+        # Download each season once; every team is computed from the same games
+        season_games = asyncio.run(fetch_seasons(sorted(set(seasons) | set(season_range))))
+
         # Process each team
         for team_name in analysis['team_names']:
             team_id = get_team_id(team_name)
@@ -273,16 +356,12 @@ def analyze_team_wins():
                 continue
                 
             results['data'][team_name] = {}
-            for season in range(analysis['seasons'][0], analysis['seasons'][-1] + 1):
-                wins = get_team_wins(team_id, season)
+            for season in seasons:
+                wins = get_team_wins(team_id, season, season_games[season])
                 results['data'][team_name][season] = wins
 
-        if analysis['comparison_type'] == 'league_average':
-            season_range = sorted(set(analysis['seasons']))
-            if len(season_range) == 2 and season_range[1] - season_range[0] >=1:
-                season_range = list(range(season_range[0], season_range[1] + 1))
-            for season in season_range:
-                results['league_averages'][season] = get_league_avg_wins(season)
+        for season in season_range:
+            results['league_averages'][season] = get_league_avg_wins(season, season_games[season])
         return jsonify(results)
     
     except Exception as e:
@@ -0,0 +1,101 @@
+"""
+Pure parsers for Basketball Reference player and coach detail pages.
+
+Kept free of import-time side effects (no database or HTTP clients) because
+scraper.py runs them in a process pool, and spawned workers import this module.
+"""
+
+import re
+import lxml.html
+
+# An HTML comment that contains a <table> (Basketball-Reference hides secondary tables this way)
+COMMENTED_TABLE_RE = re.compile(r'<!--((?:(?!-->).)*?<table.*?)-->', re.DOTALL)
+
+def lxml_text(element, separator=""):
+    """lxml equivalent of BeautifulSoup's get_text(separator, strip=True)"""
+    return separator.join(text.strip() for text in element.itertext() if text.strip())
+
+def parse_bio(tree):
+    """'Key: value' paragraphs of a detail page's div#meta as a dict, or None if there is no meta block"""
+    if not tree.xpath('//div[@id="meta"]'):
+        return None
+    texts = (lxml_text(p, " ") for p in tree.xpath('//div[@id="meta"]//p'))
+    return {key.strip(): value.strip() for key, value in (text.split(':', 1) for text in texts if ':' in text)}
+
+def uncomment_tables(html):
+    """Unwrap tables embedded in HTML comments so the parser sees them"""
+    return COMMENTED_TABLE_RE.sub(r'\1', html)
+
+
+def parse_player_details(html, full_name):
+    """
+    Parse every available table & stat from a player's Basketball Reference page.
+    Pure so it can run in the parse pool. Missing data is stored as None.
+    """
+    # Detail pages are table-heavy, so walk lxml's tree directly rather than building a soup
+    tree = lxml.html.document_fromstring(uncomment_tables(html))
+
+    details = {
+        "full_name": full_name,
+        "bio": {},
+        "stats": {}
+    }
+
+    # === Bio / Metadata extraction ===
+    details["bio"] = parse_bio(tree)
+
+    # === Extract ALL tables dynamically ===
+    for table in tree.iter('table'):
+        table_id = table.get('id', 'unknown_table')
+        headers = [lxml_text(th) for th in table.iter('th')]
+        rows_data = []
+
+        for row in table.iter('tr'):
+            if 'thead' in (row.get('class') or '').split():
+                continue
+            row_values = [lxml_text(cell) or None for cell in row.iter('th', 'td')]
+            rows_data.append(row_values)
+
+        details["stats"][table_id] = {
+            "headers": headers,
+            "rows": rows_data if rows_data else None
+        }
+
+    return details
+
+
+def parse_coach_details(html, coach_url, coach_name):
+    """Parse a coach's Basketball Reference page. Pure so it can run in the parse pool."""
+    tree = lxml.html.document_fromstring(uncomment_tables(html))
+    details = {
+        "full_name": coach_name,
+        "url": coach_url,
+        "bio": {},
+        "stats": {}
+    }
+
+    # === Bio / Meta (similar to players) ===
+    details["bio"] = parse_bio(tree)
+
+    # === Coaching tables ===
+    for table in tree.iter("table"):
+        table_id = table.get("id", "unknown_table")
+        headers = [lxml_text(th) for th in table.iter("th")]
+        rows_data = []
+
+        for row in table.iter("tr"):
+            if "thead" in (row.get("class") or "").split():
+                continue
+            row_values = []
+            for cell in row.iter("th", "td"):
+                val = lxml_text(cell)
+                row_values.append(val if val != "" else None)
+            if any(row_values):
+                rows_data.append(row_values)
+
+        details["stats"][table_id] = {
+            "headers": headers,
+            "rows": rows_data if rows_data else None
+        }
+
+    return details
@@ -9,18 +9,23 @@ intelligent analysis of basketball statistics.
 import os
 import json
 import numpy as np
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from datetime import datetime
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from openai import OpenAI
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 from dotenv import load_dotenv
 import pickle
 import hashlib
 from sentence_transformers import SentenceTransformer
 import faiss
 import re
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +34,51 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sentence embedding model, run through ONNX Runtime using the int8-quantized export
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_MODEL_FILE = 'onnx/model_qint8_avx512_vnni.onnx'
+# MiniLM only sees its first 256 tokens (~1000 characters); longer text is wasted encoder work
+MAX_EMBEDDING_CHARS = 1000
+
+# RAG_INDEX_TYPE values backed by faiss.IndexScalarQuantizer
+SCALAR_QUANTIZER_TYPES = {
+    'sq8': faiss.ScalarQuantizer.QT_8bit,
+    'fp16': faiss.ScalarQuantizer.QT_fp16,
+}
+
+# Prefix of the analysis returned when the OpenAI call fails
+GENERATION_ERROR_MESSAGE = "I apologize, but I encountered an error while generating the analysis"
+
+# Vector store snapshot files in the cache dir: {corpus hash}-{index type}[-sampleN].faiss/.pkl
+SNAPSHOT_FILE_RE = re.compile(r'^([0-9a-f]{40})-.+?\.(?:faiss|pkl)(?:\.tmp)?$')
+
+# Cosine similarity above which a previous answer is reused for a new query
+RESPONSE_CACHE_THRESHOLD = 0.92
+# Most recent answers kept in the response cache; older ones are dropped first
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+
+# Static system prompt for generate_response. Kept byte-identical across
+# requests and sent first so OpenAI can reuse the cached prompt prefix.
+ANALYSIS_INSTRUCTIONS = """You are an expert NBA analyst with access to comprehensive basketball statistics data.
+Use the provided context to answer the user's question about NBA statistics, players, teams, games, or coaches.
+
+Instructions:
+1. Provide accurate, data-driven analysis based on the context
+2. If specific data is not available in the context, mention this limitation
+3. Use statistics and numbers to support your analysis
+4. Be specific about time periods, teams, and players when relevant
+5. If comparing teams or players, provide concrete numbers
+6. Keep responses informative but concise"""
+
+@lru_cache(maxsize=1)
+def load_embedding_model() -> SentenceTransformer:
+    """Load the embedding model once per process; every vector store shares it"""
+    return SentenceTransformer(
+        EMBEDDING_MODEL_NAME,
+        backend='onnx',
+        model_kwargs={'file_name': EMBEDDING_MODEL_FILE}
+    )
+
 @dataclass
 class Document:
     """Represents a document in the vector database"""
@@ -36,78 +86,218 @@ class Document:
     content: str
     metadata: Dict[str, Any]
     embedding: Optional[np.ndarray] = None
+    embedding_text: Optional[str] = None  # Text to embed; defaults to the head of content
+    
+    def text_to_embed(self) -> str:
+        """Text the embedding is computed from (content is still used in full as LLM context)"""
+        if self.embedding_text is not None:
+            return self.embedding_text
+        return self.content[:MAX_EMBEDDING_CHARS]
 
 class NBAVectorStore:
     """Vector store for NBA statistics data using FAISS"""
     
-    def __init__(self, dimension: int = 384):
+    def __init__(self, dimension: int = 384, index_type: str = 'hnsw'):
         self.dimension = dimension
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product for cosine similarity
+        self.index_type = index_type
+        self.index = self._create_index()
+        self.documents = {}
+        self.doc_ids = []  # FAISS internal id -> document id, in insertion order
+        self.embedding_model = load_embedding_model()
+        # Identifies the embedding space so cached vectors from another model are never mixed in
+        self.model_id = f"{EMBEDDING_MODEL_NAME}-{os.path.splitext(os.path.basename(EMBEDDING_MODEL_FILE))[0]}"
+    
+    def _create_index(self, nlist: int = 1):
+        """Create an empty FAISS index of the configured type"""
+        if self.index_type == 'ivfflat':
+            # Inverted file over full vectors; nlist is sized from the corpus when it is trained
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = 8
+            return index
+        
+        if self.index_type in SCALAR_QUANTIZER_TYPES:
+            # Exact scan over 8-bit or 16-bit codes (4x / 2x less memory traffic than fp32)
+            return faiss.IndexScalarQuantizer(
+                self.dimension, SCALAR_QUANTIZER_TYPES[self.index_type], faiss.METRIC_INNER_PRODUCT
+            )
+        
+        if self.index_type == 'ivfpq':
+            # Product-quantized inverted file: 48 one-byte codes per vector (8x smaller than fp32).
+            # Untrained until the first add_documents() call.
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            index = faiss.IndexIVFPQ(quantizer, self.dimension, 256, 48, 8, faiss.METRIC_INNER_PRODUCT)
+            index.nprobe = 16
+            return index
+        
+        if self.index_type != 'hnsw':
+            raise ValueError(f"Unknown index type: {self.index_type}")
+        
+        # HNSW graph over inner product (embeddings are normalized, so this is cosine similarity)
+        index = faiss.IndexHNSWFlat(self.dimension, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+        index.hnsw.efSearch = 64
+        return index
+    
+    def _train_index(self, embeddings: np.ndarray):
+        """Train a quantized index on the first batch of embeddings"""
+        if self.index_type == 'ivfflat':
+            self.index = self._create_index(nlist=max(1, int(np.sqrt(len(embeddings)))))
+            logger.info(f"Training ivfflat index ({self.index.nlist} lists) on {len(embeddings)} embeddings...")
+            self.index.train(embeddings)
+            return
+        
+        if self.index_type in SCALAR_QUANTIZER_TYPES:
+            # Learns the per-dimension value range the codes are scaled to
+            self.index.train(embeddings)
+            return
+        
+        # PQ needs at least 2^nbits training points per sub-quantizer and IVF one per list
+        min_points = max(self.index.nlist, 256)
+        if len(embeddings) < min_points:
+            logger.warning(
+                f"Only {len(embeddings)} documents, need {min_points} to train {self.index_type}; "
+                "falling back to an exact flat index"
+            )
+            self.index = faiss.IndexFlatIP(self.dimension)
+            return
+        
+        logger.info(f"Training {self.index_type} index on {len(embeddings)} embeddings...")
+        self.index.train(embeddings)
+    
+    def reset(self):
+        """Remove all documents from the vector store"""
+        self.index = self._create_index()
         self.documents = {}
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        self.doc_ids = []
         
     def add_documents(self, documents: List[Document]):
         """Add documents to the vector store"""
-        embeddings = []
-        doc_ids = []
+        # Encode everything missing an embedding in one batched call
+        pending = [doc for doc in documents if doc.embedding is None]
+        if pending:
+            new_embeddings = self.embedding_model.encode(
+                [doc.text_to_embed() for doc in pending],
+                batch_size=64,
+                convert_to_numpy=True,
+                normalize_embeddings=True,  # inner product == cosine similarity
+                show_progress_bar=False
+            )
+            for doc, embedding in zip(pending, new_embeddings):
+                doc.embedding = embedding
         
         for doc in documents:
-            if doc.embedding is None:
-                doc.embedding = self.embedding_model.encode(doc.content)
-            
-            embeddings.append(doc.embedding)
-            doc_ids.append(doc.id)
             self.documents[doc.id] = doc
+            self.doc_ids.append(doc.id)
             
-        if embeddings:
-            embeddings_array = np.array(embeddings).astype('float32')
+        if documents:
+            embeddings_array = np.ascontiguousarray(
+                np.stack([doc.embedding for doc in documents]), dtype='float32'
+            )
+            if not self.index.is_trained:
+                self._train_index(embeddings_array)
             self.index.add(embeddings_array)
             logger.info(f"Added {len(documents)} documents to vector store")
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
-        """Search for similar documents"""
-        query_embedding = self.embedding_model.encode([query])
-        query_embedding = query_embedding.astype('float32')
+    def encode_query(self, query: str) -> np.ndarray:
+        """Embed a query as a (1, dimension) normalized float32 array"""
+        return self.embedding_model.encode([query], normalize_embeddings=True).astype('float32')
+    
+    def search(self, query: str, k: int = 5, embedding: Optional[np.ndarray] = None) -> List[Tuple[Document, float]]:
+        """Search for similar documents, optionally with a precomputed query embedding"""
+        query_embedding = self.encode_query(query) if embedding is None else embedding
         
         scores, indices = self.index.search(query_embedding, k)
         
         results = []
         for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.documents):
-                doc_id = list(self.documents.keys())[idx]
-                doc = self.documents[doc_id]
+            if 0 <= idx < len(self.doc_ids):
+                doc = self.documents[self.doc_ids[idx]]
                 results.append((doc, float(score)))
         
         return results
+    
+    def save(self, path: str):
+        """Persist the FAISS index to {path}.faiss and documents to {path}.pkl"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Write to temp files and rename them into place, so a crash never leaves a truncated snapshot
+        faiss.write_index(self.index, f"{path}.faiss.tmp")
+        # Embeddings are only kept for reuse on the next rebuild, so store them at half precision
+        documents = {
+            doc_id: replace(doc, embedding=doc.embedding.astype(np.float16) if doc.embedding is not None else None)
+            for doc_id, doc in self.documents.items()
+        }
+        with open(f"{path}.pkl.tmp", 'wb') as f:
+            pickle.dump({'documents': documents, 'doc_ids': self.doc_ids}, f)
+        os.replace(f"{path}.faiss.tmp", f"{path}.faiss")
+        os.replace(f"{path}.pkl.tmp", f"{path}.pkl")
+        logger.info(f"Saved vector store to {path}")
+    
+    def load(self, path: str) -> bool:
+        """Load a vector store saved with save(); returns False if none exists or it is unreadable"""
+        if not (os.path.exists(f"{path}.faiss") and os.path.exists(f"{path}.pkl")):
+            return False
+        
+        try:
+            index = faiss.read_index(f"{path}.faiss")
+            with open(f"{path}.pkl", 'rb') as f:
+                state = pickle.load(f)
+            documents, doc_ids = state['documents'], state['doc_ids']
+        except (OSError, RuntimeError, EOFError, pickle.UnpicklingError, KeyError) as e:
+            # Treat a damaged snapshot as a cache miss; the rebuild overwrites it
+            logger.warning(f"Ignoring unreadable vector store at {path}: {e}")
+            return False
+        
+        self.index = index
+        self.documents = documents
+        self.doc_ids = doc_ids
+        logger.info(f"Loaded {len(self.doc_ids)} documents from {path}")
+        return True
 
 class NBADataProcessor:
     """Processes NBA data from MongoDB into text chunks for RAG"""
     
-    def __init__(self, mongo_uri: str):
-        self.client = MongoClient(mongo_uri)
+    def __init__(self, mongo_uri: str, client: Optional[MongoClient] = None):
+        # An existing client can be shared to avoid a second connection handshake
+        self.client = client or MongoClient(mongo_uri)
         self.db = self.client["nba_stats"]
-        
-    def process_teams_data(self) -> List[Document]:
-        """Convert teams data to text documents"""
+    
+    def corpus_fingerprint(self) -> str:
+        """Hash the _id and last_modified of every source document"""
+        sha = hashlib.sha1()
+        for collection in ('teams', 'players', 'games', 'coaches'):
+            sha.update(collection.encode())
+            cursor = self.db[collection].find({}, {'_id': 1, 'last_modified': 1}).sort('_id', 1)
+            for doc in cursor:
+                sha.update(f"{doc['_id']}:{doc.get('last_modified')}".encode())
+        return sha.hexdigest()
+        
+    def process_teams_data(self, limit: int = 0) -> List[Document]:
+        """Convert teams data to text documents (at most limit teams; 0 for all)"""
         documents = []
-        teams = self.db.teams.find()
+        teams = self.db.teams.find({}, projection={
+            'name': 1, 'abbreviation': 1, 'city': 1, 'founded_year': 1, 'league': 1,
+            'games': 1, 'wins': 1, 'losses': 1, 'win_loss_pct': 1, 'years_playoffs': 1,
+            'years_div_champs': 1, 'years_conf_champs': 1, 'years_league_champs': 1,
+            'year_min': 1, 'year_max': 1
+        }).limit(limit).batch_size(500)
         
         for team in teams:
-            content = f"""
-            Team: {team.get('name', 'Unknown')}
-            City: {team.get('city', 'Unknown')}
-            Founded: {team.get('founded_year', 'Unknown')}
-            League: {team.get('league', 'Unknown')}
-            Total Games: {team.get('games', 'Unknown')}
-            Total Wins: {team.get('wins', 'Unknown')}
-            Total Losses: {team.get('losses', 'Unknown')}
-            Win Percentage: {team.get('win_loss_pct', 'Unknown')}
-            Playoff Appearances: {team.get('years_playoffs', 'Unknown')}
-            Division Championships: {team.get('years_div_champs', 'Unknown')}
-            Conference Championships: {team.get('years_conf_champs', 'Unknown')}
-            League Championships: {team.get('years_league_champs', 'Unknown')}
-            Years Active: {team.get('year_min', 'Unknown')} - {team.get('year_max', 'Unknown')}
-            """
+            content = "\n".join([
+                f"Team: {team.get('name', 'Unknown')}",
+                f"City: {team.get('city', 'Unknown')}",
+                f"Founded: {team.get('founded_year', 'Unknown')}",
+                f"League: {team.get('league', 'Unknown')}",
+                f"Total Games: {team.get('games', 'Unknown')}",
+                f"Total Wins: {team.get('wins', 'Unknown')}",
+                f"Total Losses: {team.get('losses', 'Unknown')}",
+                f"Win Percentage: {team.get('win_loss_pct', 'Unknown')}",
+                f"Playoff Appearances: {team.get('years_playoffs', 'Unknown')}",
+                f"Division Championships: {team.get('years_div_champs', 'Unknown')}",
+                f"Conference Championships: {team.get('years_conf_champs', 'Unknown')}",
+                f"League Championships: {team.get('years_league_champs', 'Unknown')}",
+                f"Years Active: {team.get('year_min', 'Unknown')} - {team.get('year_max', 'Unknown')}"
+            ])
             
             doc_id = f"team_{team.get('abbreviation', 'unknown')}"
             metadata = {
@@ -125,17 +315,19 @@ class NBADataProcessor:
         
         return documents
     
-    def process_players_data(self) -> List[Document]:
-        """Convert players data to text documents"""
+    def process_players_data(self, limit: int = 0) -> List[Document]:
+        """Convert players data to text documents (at most limit players; 0 for all)"""
         documents = []
-        players = self.db.players.find()
+        players = self.db.players.find({}, projection={
+            'first_name': 1, 'last_name': 1, 'birth_date': 1, 'details.bio': 1, 'details.stats': 1
+        }).limit(limit).batch_size(500)
         
         for player in players:
             # Basic player info
-            content = f"""
-            Player: {player.get('first_name', '')} {player.get('last_name', '')}
-            Birth Date: {player.get('birth_date', 'Unknown')}
-            """
+            parts = [
+                f"Player: {player.get('first_name', '')} {player.get('last_name', '')}",
+                f"Birth Date: {player.get('birth_date', 'Unknown')}"
+            ]
             
             # Add detailed stats if available
             if 'details' in player and player['details']:
@@ -144,20 +336,22 @@ class NBADataProcessor:
                 # Add bio information
                 if 'bio' in details and details['bio']:
                     for key, value in details['bio'].items():
-                        content += f"\n{key}: {value}"
+                        parts.append(f"{key}: {value}")
                 
                 # Add statistics tables
                 if 'stats' in details and details['stats']:
                     for table_id, table_data in details['stats'].items():
                         if table_data and 'headers' in table_data and 'rows' in table_data:
-                            content += f"\n\n{table_id.replace('_', ' ').title()} Statistics:"
+                            parts.append(f"\n{table_id.replace('_', ' ').title()} Statistics:")
                             if table_data['headers']:
-                                content += f"\nHeaders: {', '.join(table_data['headers'])}"
+                                parts.append(f"Headers: {', '.join(table_data['headers'])}")
                             if table_data['rows'] and len(table_data['rows']) > 0:
                                 # Add first few rows as examples
                                 for i, row in enumerate(table_data['rows'][:3]):
                                     if any(cell for cell in row if cell):
-                                        content += f"\nRow {i+1}: {', '.join(str(cell) if cell else 'N/A' for cell in row)}"
+                                        parts.append(f"Row {i+1}: {', '.join(str(cell) if cell else 'N/A' for cell in row)}")
+            
+            content = "\n".join(parts)
             
             doc_id = f"player_{player.get('_id')}"
             metadata = {
@@ -175,80 +369,106 @@ class NBADataProcessor:
         
         return documents
     
-    def process_games_data(self) -> List[Document]:
-        """Convert games data to text documents (grouped by season)"""
+    def process_games_data(self, limit: int = 0) -> List[Document]:
+        """Convert games data to text documents (grouped by season; at most limit most recent seasons, 0 for all)"""
         documents = []
         
-        # Group games by season
-        pipeline = [
+        # Created here rather than in __init__ so constructing the agent never waits on Mongo
+        try:
+            self.db.games.create_index([('season', 1), ('home_team', 1), ('away_team', 1)])
+        except PyMongoError as e:
+            logger.warning(f"Could not create games index: {e}")
+        
+        # Season totals
+        season_pipeline = [
             {"$group": {
                 "_id": "$season",
-                "games": {"$push": "$$ROOT"},
-                "total_games": {"$sum": 1}
+                "total_games": {"$sum": 1},
+                "completed_games": {"$sum": {"$cond": [
+                    {"$and": [{"$gt": ["$home_score", None]}, {"$gt": ["$away_score", None]}]}, 1, 0
+                ]}},
+                "league": {"$first": "$league"}
             }},
             {"$sort": {"_id": -1}}
         ]
+        if limit:
+            season_pipeline.append({"$limit": limit})
+        season_rows = list(self.db.games.aggregate(season_pipeline))
+        
+        # Per-team wins/losses/points for every completed game, split into a home and an away row
+        home_won = {"$gt": ["$home_score", "$away_score"]}
+        team_pipeline = [
+            {"$match": {"home_score": {"$ne": None}, "away_score": {"$ne": None}}},
+            {"$project": {
+                "season": 1,
+                "sides": [
+                    {"team": "$home_team", "won": {"$cond": [home_won, 1, 0]},
+                     "points_for": "$home_score", "points_against": "$away_score"},
+                    {"team": "$away_team", "won": {"$cond": [home_won, 0, 1]},
+                     "points_for": "$away_score", "points_against": "$home_score"}
+                ]
+            }},
+            {"$unwind": "$sides"},
+            {"$group": {
+                "_id": {"season": "$season", "team": "$sides.team"},
+                "wins": {"$sum": "$sides.won"},
+                "losses": {"$sum": {"$subtract": [1, "$sides.won"]}},
+                "points_for": {"$sum": "$sides.points_for"},
+                "points_against": {"$sum": "$sides.points_against"}
+            }},
+            # Rank teams by wins and keep each season's top 10, with win percentage computed server-side
+            {"$sort": {"_id.season": 1, "wins": -1}},
+            {"$group": {
+                "_id": "$_id.season",
+                "teams": {"$push": {
+                    "team": "$_id.team",
+                    "wins": "$wins",
+                    "losses": "$losses",
+                    "win_pct": {"$divide": ["$wins", {"$max": [{"$add": ["$wins", "$losses"]}, 1]}]},
+                    "points_for": "$points_for",
+                    "points_against": "$points_against"
+                }}
+            }},
+            {"$project": {"teams": {"$slice": ["$teams", 10]}}}
+        ]
         
-        seasons = list(self.db.games.aggregate(pipeline))
+        if limit:
+            # Only aggregate the seasons that were selected above
+            team_pipeline.insert(0, {"$match": {"season": {"$in": [row['_id'] for row in season_rows]}}})
         
-        for season_data in seasons:
+        top_teams_by_season = {
+            row['_id']: row['teams'] for row in self.db.games.aggregate(team_pipeline)
+        }
+        
+        for season_data in season_rows:
             season = season_data['_id']
-            games = season_data['games']
-            
-            # Calculate season statistics
-            total_games = len(games)
-            completed_games = [g for g in games if g.get('away_score') is not None and g.get('home_score') is not None]
-            
-            # Team performance summary
-            team_stats = {}
-            for game in completed_games:
-                home_team = game.get('home_team')
-                away_team = game.get('away_team')
-                home_score = game.get('home_score', 0)
-                away_score = game.get('away_score', 0)
-                
-                if home_team not in team_stats:
-                    team_stats[home_team] = {'wins': 0, 'losses': 0, 'points_for': 0, 'points_against': 0}
-                if away_team not in team_stats:
-                    team_stats[away_team] = {'wins': 0, 'losses': 0, 'points_for': 0, 'points_against': 0}
-                
-                if home_score > away_score:
-                    team_stats[home_team]['wins'] += 1
-                    team_stats[away_team]['losses'] += 1
-                else:
-                    team_stats[away_team]['wins'] += 1
-                    team_stats[home_team]['losses'] += 1
-                
-                team_stats[home_team]['points_for'] += home_score
-                team_stats[home_team]['points_against'] += away_score
-                team_stats[away_team]['points_for'] += away_score
-                team_stats[away_team]['points_against'] += home_score
+            total_games = season_data['total_games']
+            completed_games = season_data['completed_games']
+            top_teams = top_teams_by_season.get(season, [])
             
             # Create content
-            content = f"""
-            NBA Season {season} Statistics:
-            Total Games: {total_games}
-            Completed Games: {len(completed_games)}
-            League: {games[0].get('league', 'NBA') if games else 'Unknown'}
-            
-            Team Performance Summary:
-            """
+            parts = [
+                f"NBA Season {season} Statistics:",
+                f"Total Games: {total_games}",
+                f"Completed Games: {completed_games}",
+                f"League: {season_data.get('league') or 'NBA'}",
+                "",
+                "Team Performance Summary:"
+            ]
             
             # Add top teams by wins
-            sorted_teams = sorted(team_stats.items(), key=lambda x: x[1]['wins'], reverse=True)
-            for team, stats in sorted_teams[:10]:  # Top 10 teams
-                win_pct = stats['wins'] / (stats['wins'] + stats['losses']) if (stats['wins'] + stats['losses']) > 0 else 0
-                content += f"""
-            {team}: {stats['wins']}W-{stats['losses']}L ({win_pct:.3f}), 
-            Points For: {stats['points_for']}, Points Against: {stats['points_against']}
-            """
+            for stats in top_teams:
+                parts.append(f"{stats['team']}: {stats['wins']}W-{stats['losses']}L ({stats['win_pct']:.3f}),")
+                parts.append(f"Points For: {stats['points_for']}, Points Against: {stats['points_against']}")
+            
+            content = "\n".join(parts)
             
             doc_id = f"season_{season}"
             metadata = {
                 'type': 'season',
                 'season': season,
                 'total_games': total_games,
-                'completed_games': len(completed_games)
+                'completed_games': completed_games
             }
             
             documents.append(Document(
@@ -259,32 +479,34 @@ class NBADataProcessor:
         
         return documents
     
-    def process_coaches_data(self) -> List[Document]:
-        """Convert coaches data to text documents"""
+    def process_coaches_data(self, limit: int = 0) -> List[Document]:
+        """Convert coaches data to text documents (at most limit coaches; 0 for all)"""
         documents = []
-        coaches = self.db.coaches.find()
+        coaches = self.db.coaches.find({}, projection={
+            'full_name': 1, 'bio': 1, 'stats': 1
+        }).limit(limit).batch_size(500)
         
         for coach in coaches:
-            content = f"""
-            Coach: {coach.get('full_name', 'Unknown')}
-            """
+            parts = [f"Coach: {coach.get('full_name', 'Unknown')}"]
             
             # Add bio information
             if 'bio' in coach and coach['bio']:
                 for key, value in coach['bio'].items():
-                    content += f"\n{key}: {value}"
+                    parts.append(f"{key}: {value}")
             
             # Add coaching statistics
             if 'stats' in coach and coach['stats']:
                 for table_id, table_data in coach['stats'].items():
                     if table_data and 'headers' in table_data and 'rows' in table_data:
-                        content += f"\n\n{table_id.replace('_', ' ').title()} Statistics:"
+                        parts.append(f"\n{table_id.replace('_', ' ').title()} Statistics:")
                         if table_data['headers']:
-                            content += f"\nHeaders: {', '.join(table_data['headers'])}"
+                            parts.append(f"Headers: {', '.join(table_data['headers'])}")
                         if table_data['rows'] and len(table_data['rows']) > 0:
                             for i, row in enumerate(table_data['rows'][:5]):  # First 5 rows
                                 if any(cell for cell in row if cell):
-                                    content += f"\nRow {i+1}: {', '.join(str(cell) if cell else 'N/A' for cell in row)}"
+                                    parts.append(f"Row {i+1}: {', '.join(str(cell) if cell else 'N/A' for cell in row)}")
+            
+            content = "\n".join(parts)
             
             doc_id = f"coach_{coach.get('_id')}"
             metadata = {
@@ -303,83 +525,204 @@ class NBADataProcessor:
 class NBARAGAgent:
     """Main RAG agent for NBA statistics analysis"""
     
-    def __init__(self, mongo_uri: str, openai_api_key: str):
+    def __init__(self, mongo_uri: str, openai_api_key: str, cache_dir: Optional[str] = None,
+                 index_type: Optional[str] = None, client: Optional[MongoClient] = None):
         self.mongo_uri = mongo_uri
         self.openai_client = OpenAI(api_key=openai_api_key)
-        self.vector_store = NBAVectorStore()
-        self.data_processor = NBADataProcessor(mongo_uri)
+        self.vector_store = NBAVectorStore(index_type=index_type or os.getenv("RAG_INDEX_TYPE", "hnsw"))
+        self.data_processor = NBADataProcessor(mongo_uri, client=client)
+        self.cache_dir = cache_dir or os.getenv(
+            "RAG_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".rag_cache")
+        )
+        self.snapshot_dir = os.path.join(self.cache_dir, self.vector_store.model_id)
         self.is_initialized = False
+        self.sample_size = None  # set when initialized over a truncated corpus
+        
+        # Semantic response cache: query embeddings -> previous analyze() results
+        self._response_cache_lock = threading.Lock()
+        self._response_cache_path = os.path.join(self.snapshot_dir, 'responses.pkl')
+        self._response_cache_index = faiss.IndexFlatIP(self.vector_store.dimension)
+        self._response_cache_entries = []
+        self._load_response_cache()
+    
+    def _load_response_cache(self):
+        """Load cached responses saved by a previous run"""
+        try:
+            with open(self._response_cache_path, 'rb') as f:
+                entries = pickle.load(f)[-RESPONSE_CACHE_MAX_ENTRIES:]
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
         
-    def initialize(self, force_rebuild: bool = False):
-        """Initialize the RAG system by processing data and building vector store"""
+        if entries:
+            self._response_cache_index.add(np.stack([entry['embedding'] for entry in entries]))
+            self._response_cache_entries = entries
+            logger.info(f"Loaded {len(entries)} cached responses")
+    
+    def _clear_response_cache(self):
+        """Drop cached responses, e.g. after the underlying data changed"""
+        with self._response_cache_lock:
+            self._response_cache_index.reset()
+            self._response_cache_entries = []
+            if os.path.exists(self._response_cache_path):
+                os.remove(self._response_cache_path)
+    
+    def _lookup_response(self, query_embedding: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Return the cached result of the most similar previous query, if close enough"""
+        if self.sample_size:
+            return None
+        with self._response_cache_lock:
+            if not self._response_cache_entries:
+                return None
+            scores, indices = self._response_cache_index.search(query_embedding, 1)
+            if scores[0][0] < RESPONSE_CACHE_THRESHOLD:
+                return None
+            return self._response_cache_entries[indices[0][0]]['response']
+    
+    def _store_response(self, query_embedding: np.ndarray, response: Dict[str, Any]):
+        """Add a result to the response cache and persist it"""
+        if self.sample_size:
+            # Answers from a truncated corpus must not be served to full-corpus agents
+            return
+        with self._response_cache_lock:
+            self._response_cache_entries.append({'embedding': query_embedding[0], 'response': response})
+            if len(self._response_cache_entries) > RESPONSE_CACHE_MAX_ENTRIES:
+                # Drop the oldest answers; a flat index has no remove, so rebuild it
+                self._response_cache_entries = self._response_cache_entries[-RESPONSE_CACHE_MAX_ENTRIES:]
+                self._response_cache_index.reset()
+                self._response_cache_index.add(np.stack([entry['embedding'] for entry in self._response_cache_entries]))
+            else:
+                self._response_cache_index.add(query_embedding)
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            # Write then rename, so an interrupted write never leaves a truncated cache file
+            with open(f"{self._response_cache_path}.tmp", 'wb') as f:
+                pickle.dump(self._response_cache_entries, f)
+            os.replace(f"{self._response_cache_path}.tmp", self._response_cache_path)
+    
+    def _load_previous_embeddings(self) -> Dict[str, Tuple[str, np.ndarray]]:
+        """Map document id -> (embedded text, embedding) from the most recent snapshot"""
+        try:
+            with open(os.path.join(self.snapshot_dir, 'LATEST')) as f:
+                latest = f.read().strip()
+            with open(os.path.join(self.snapshot_dir, f"{latest}.pkl"), 'rb') as f:
+                documents = pickle.load(f)['documents']
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+            return {}
+        
+        return {doc_id: (doc.text_to_embed(), doc.embedding) for doc_id, doc in documents.items()}
+    
+    def _write_latest(self, cache_key: str):
+        """Atomically point LATEST at a full-build snapshot"""
+        latest_path = os.path.join(self.snapshot_dir, 'LATEST')
+        with open(f"{latest_path}.tmp", 'w') as f:
+            f.write(cache_key)
+        os.replace(f"{latest_path}.tmp", latest_path)
+    
+    def _prune_snapshots(self, corpus_hash: str):
+        """Delete snapshots of older corpus versions, except the one LATEST points to"""
+        try:
+            with open(os.path.join(self.snapshot_dir, 'LATEST')) as f:
+                latest = f.read().strip()
+        except OSError:
+            latest = None
+        
+        for name in os.listdir(self.snapshot_dir):
+            match = SNAPSHOT_FILE_RE.match(name)
+            if not match or match.group(1) == corpus_hash or name.split('.', 1)[0] == latest:
+                continue
+            try:
+                os.remove(os.path.join(self.snapshot_dir, name))
+            except OSError as e:
+                logger.warning(f"Could not remove old snapshot file {name}: {e}")
+        
+    def initialize(self, force_rebuild: bool = False, sample_size: Optional[int] = None):
+        """
+        Initialize the RAG system by processing data and building vector store.
+        sample_size caps the corpus at roughly that many documents (split across
+        the four data types) for quick smoke tests.
+        """
         if self.is_initialized and not force_rebuild:
             logger.info("RAG system already initialized")
             return
         
         logger.info("Initializing NBA RAG system...")
+        self.sample_size = sample_size
+        
+        # Reuse the persisted vector store if the corpus has not changed
+        corpus_hash = self.data_processor.corpus_fingerprint()
+        cache_key = f"{corpus_hash}-{self.vector_store.index_type}"
+        if sample_size:
+            cache_key += f"-sample{sample_size}"
+        cache_path = os.path.join(self.snapshot_dir, cache_key)
+        if not force_rebuild and self.vector_store.load(cache_path):
+            self.is_initialized = True
+            logger.info("RAG system loaded from cache!")
+            return
         
-        # Process all data types
-        all_documents = []
-        
-        logger.info("Processing teams data...")
-        all_documents.extend(self.data_processor.process_teams_data())
-        
-        logger.info("Processing players data...")
-        all_documents.extend(self.data_processor.process_players_data())
-        
-        logger.info("Processing games data...")
-        all_documents.extend(self.data_processor.process_games_data())
-        
-        logger.info("Processing coaches data...")
-        all_documents.extend(self.data_processor.process_coaches_data())
+        # Process all data types concurrently (pymongo is thread-safe and releases the GIL on I/O)
+        logger.info("Processing teams, players, games and coaches data...")
+        limit = max(1, sample_size // 4) if sample_size else 0
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [
+                executor.submit(self.data_processor.process_teams_data, limit),
+                executor.submit(self.data_processor.process_players_data, limit),
+                executor.submit(self.data_processor.process_games_data, limit),
+                executor.submit(self.data_processor.process_coaches_data, limit)
+            ]
+            all_documents = list(itertools.chain.from_iterable(f.result() for f in futures))
+        
+        # Answers cached against the old data may be stale
+        if not sample_size:
+            self._clear_response_cache()
+        
+        # Only re-embed documents that changed since the last snapshot
+        previous = self._load_previous_embeddings()
+        for doc in all_documents:
+            cached = previous.get(doc.id)
+            if cached and cached[0] == doc.text_to_embed():
+                doc.embedding = cached[1]
         
         # Add to vector store
         logger.info(f"Adding {len(all_documents)} documents to vector store...")
+        self.vector_store.reset()
         self.vector_store.add_documents(all_documents)
         
+        self.vector_store.save(cache_path)
+        # Only full builds become the base for incremental re-embedding
+        if not sample_size:
+            self._write_latest(cache_key)
+        # Every scrape stamps last_modified, so without pruning each run would add a full snapshot
+        self._prune_snapshots(corpus_hash)
+        
         self.is_initialized = True
         logger.info("RAG system initialization complete!")
     
-    def search_relevant_documents(self, query: str, k: int = 5) -> List[Tuple[Document, float]]:
+    def search_relevant_documents(self, query: str, k: int = 5,
+                                  embedding: Optional[np.ndarray] = None) -> List[Tuple[Document, float]]:
         """Search for relevant documents based on query"""
         if not self.is_initialized:
             raise ValueError("RAG system not initialized. Call initialize() first.")
         
-        return self.vector_store.search(query, k)
+        return self.vector_store.search(query, k, embedding=embedding)
     
-    def generate_response(self, query: str, context_documents: List[Document]) -> str:
-        """Generate response using OpenAI with retrieved context"""
-        
+    def _build_messages(self, query: str, context_documents: List[Document]) -> List[Dict[str, str]]:
+        """Build the chat messages for a query and its retrieved documents"""
         # Prepare context from retrieved documents
         context = "\n\n".join([
             f"Document {i+1} ({doc.metadata.get('type', 'unknown')}):\n{doc.content}"
             for i, doc in enumerate(context_documents)
         ])
         
-        prompt = f"""
-        You are an expert NBA analyst with access to comprehensive basketball statistics data. 
-        Use the provided context to answer the user's question about NBA statistics, players, teams, games, or coaches.
-        
-        Context Data:
-        {context}
-        
-        User Question: {query}
-        
-        Instructions:
-        1. Provide accurate, data-driven analysis based on the context
-        2. If specific data is not available in the context, mention this limitation
-        3. Use statistics and numbers to support your analysis
-        4. Be specific about time periods, teams, and players when relevant
-        5. If comparing teams or players, provide concrete numbers
-        6. Keep responses informative but concise
-        
-        Analysis:
-        """
-        
+        return [
+            {"role": "system", "content": ANALYSIS_INSTRUCTIONS},
+            {"role": "user", "content": f"Context Data:\n{context}\n\nUser Question: {query}"}
+        ]
+    
+    def generate_response(self, query: str, context_documents: List[Document]) -> str:
+        """Generate response using OpenAI with retrieved context"""
         try:
             response = self.openai_client.chat.completions.create(
                 model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
+                messages=self._build_messages(query, context_documents),
                 temperature=0.3,
                 max_tokens=1000
             )
@@ -388,34 +731,117 @@ class NBARAGAgent:
             
         except Exception as e:
             logger.error(f"Error generating response: {e}")
-            return f"I apologize, but I encountered an error while generating the analysis: {str(e)}"
+            return f"{GENERATION_ERROR_MESSAGE}: {str(e)}"
+    
+    def generate_response_stream(self, query: str, context_documents: List[Document]) -> Iterator[str]:
+        """Generate response using OpenAI with retrieved context, yielding text as it arrives"""
+        try:
+            response = self.openai_client.chat.completions.create(
+                model="gpt-4o",
+                messages=self._build_messages(query, context_documents),
+                temperature=0.3,
+                max_tokens=1000,
+                stream=True
+            )
+            
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                    
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            yield f"{GENERATION_ERROR_MESSAGE}: {str(e)}"
+    
+    def _format_sources(self, relevant_docs: List[Tuple[Document, float]]) -> List[Dict[str, Any]]:
+        """Describe retrieved documents for the API response"""
+        return [
+            {
+                "type": doc.metadata.get('type', 'unknown'),
+                "id": doc.id,
+                "relevance_score": float(score),
+                "metadata": doc.metadata
+            }
+            for doc, score in relevant_docs
+        ]
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query once so it can be passed to analyze_embedded() repeatedly"""
+        return self.vector_store.encode_query(query)
     
     def analyze(self, query: str, k: int = 5) -> Dict[str, Any]:
         """Main method to analyze NBA statistics using RAG"""
         if not self.is_initialized:
             self.initialize()
         
+        # Embed once; the same vector serves the cache lookup and retrieval
+        return self.analyze_embedded(self.embed_query(query), query, k)
+    
+    def analyze_embedded(self, query_embedding: np.ndarray, query: str, k: int = 5) -> Dict[str, Any]:
+        """analyze() for a query already embedded with embed_query()"""
+        if not self.is_initialized:
+            self.initialize()
+        
+        # Answer paraphrases of previous questions from the response cache
+        cached = self._lookup_response(query_embedding)
+        if cached:
+            logger.info("Response cache hit")
+            return {**cached, "query": query}
+        
         # Search for relevant documents
-        relevant_docs = self.search_relevant_documents(query, k)
+        relevant_docs = self.search_relevant_documents(query, k, embedding=query_embedding)
         
         # Generate response
         analysis = self.generate_response(query, [doc for doc, score in relevant_docs])
         
         # Prepare response
-        return {
+        result = {
+            "query": query,
+            "analysis": analysis,
+            "sources": self._format_sources(relevant_docs),
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        if not analysis.startswith(GENERATION_ERROR_MESSAGE):
+            self._store_response(query_embedding, result)
+        return result
+    
+    def analyze_stream(self, query: str, k: int = 5) -> Iterator[Dict[str, Any]]:
+        """Streaming variant of analyze()
+        
+        Yields a "sources" event, then "token" events with pieces of the analysis
+        as the LLM produces them, then a final "done" event.
+        """
+        if not self.is_initialized:
+            self.initialize()
+        
+        query_embedding = self.vector_store.encode_query(query)
+        cached = self._lookup_response(query_embedding)
+        if cached:
+            logger.info("Response cache hit")
+            yield {"type": "sources", "query": query, "sources": cached["sources"]}
+            yield {"type": "token", "content": cached["analysis"]}
+            yield {"type": "done", "timestamp": cached["timestamp"]}
+            return
+        
+        relevant_docs = self.search_relevant_documents(query, k, embedding=query_embedding)
+        sources = self._format_sources(relevant_docs)
+        yield {"type": "sources", "query": query, "sources": sources}
+        
+        pieces = []
+        for piece in self.generate_response_stream(query, [doc for doc, score in relevant_docs]):
+            pieces.append(piece)
+            yield {"type": "token", "content": piece}
+        
+        analysis = "".join(pieces)
+        result = {
             "query": query,
             "analysis": analysis,
-            "sources": [
-                {
-                    "type": doc.metadata.get('type', 'unknown'),
-                    "id": doc.id,
-                    "relevance_score": float(score),
-                    "metadata": doc.metadata
-                }
-                for doc, score in relevant_docs
-            ],
+            "sources": sources,
             "timestamp": datetime.now().isoformat()
         }
+        if not analysis.startswith(GENERATION_ERROR_MESSAGE):
+            self._store_response(query_embedding, result)
+        yield {"type": "done", "timestamp": result["timestamp"]}
 
 # Example usage and testing
 if __name__ == "__main__":
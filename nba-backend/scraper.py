@@ -1,15 +1,21 @@
 import psycopg2
 import cloudscraper
-from bs4 import BeautifulSoup, Comment
+import asyncio
+import aiohttp
+from bs4 import BeautifulSoup, Comment, SoupStrainer
+from detail_parsers import parse_player_details, parse_coach_details
 import time
 from datetime import datetime
 import re
 from tqdm import tqdm
 import random
-from fake_useragent import UserAgent
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from datetime import datetime, date
 import string
+import hashlib
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
 import pymongo
 import os
 from dotenv import load_dotenv
@@ -25,16 +31,60 @@ teams_collection = db['teams']
 players_collection = db['players']
 games_collection = db['games']
 coaches_collection = db['coaches']
+progress_collection = db['_progress']  # resume checkpoints and fully stored seasons
+
+# Unique index on each collection's upsert filter
+UPSERT_INDEXES = (
+    (players_collection, [("first_name", 1), ("last_name", 1), ("birth_date", 1)]),
+    (games_collection, [("date", 1), ("home_team", 1), ("away_team", 1)]),
+    (teams_collection, [("abbreviation", 1)]),
+    (coaches_collection, [("url", 1)]),
+)
+
+def ensure_indexes():
+    """Unique indexes on every upsert filter so upserts probe an index instead of scanning"""
+    for collection, keys in UPSERT_INDEXES:
+        try:
+            collection.create_index(keys, unique=True)
+        except pymongo.errors.PyMongoError as e:
+            # e.g. existing duplicates; upserts still work, just without this index
+            fields = ", ".join(field for field, _ in keys)
+            print(f"Could not create index on {collection.name} ({fields}): {e}")
+
+ensure_indexes()
 
 scraper = cloudscraper.create_scraper()
 
-ua = UserAgent()
+# Representative desktop/mobile browser user agents, rotated per request
+UA_POOL = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 Edg/141.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36 Edg/140.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:144.0) Gecko/20100101 Firefox/144.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:143.0) Gecko/20100101 Firefox/143.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 OPR/123.0.0.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/26.0 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.6 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:144.0) Gecko/20100101 Firefox/144.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36 Edg/141.0.0.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:144.0) Gecko/20100101 Firefox/144.0",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:143.0) Gecko/20100101 Firefox/143.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 18_6 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.6 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Mobile Safari/537.36",
+)
 
 def get_headers():
     return {
-        'User-Agent': ua.random,
+        'User-Agent': random.choice(UA_POOL),
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
+        'Accept-Encoding': 'br, gzip, deflate',  # br needs the Brotli package to decode
         'Referer': 'https://www.google.com/',
         'DNT': '1'
     }
@@ -51,6 +101,42 @@ def get_db_connection():
 
 
 DELAY = 30  # seconds between requests
+BASE_URL = "https://www.basketball-reference.com"
+MAX_CONCURRENT_REQUESTS = 8  # basketball-reference is strict about request rates
+
+# On-disk cache for pages that no longer change (finished seasons' schedules), so reruns
+# don't re-download them. Index pages and the current season are always fetched fresh.
+PAGE_CACHE_DIR = os.getenv("BBREF_CACHE_DIR", ".bbref_cache")
+PAGE_CACHE_TTL = 30 * 24 * 3600  # seconds
+
+# Parsing is CPU bound, so detail pages are parsed across processes (see get_parse_pool).
+# The parsers live in detail_parsers, which workers can import without side effects.
+parse_pool = None
+
+# Pages fetched this run, so overlapping walks don't re-request (or re-read from disk) a URL
+PAGE_MEMO_SIZE = 256
+fetched_pages = OrderedDict()
+
+# Bounds in-flight requests across every concurrent scrape task
+request_slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+MAX_BACKOFF = 3600  # longest single back-off sleep in safe_request, in seconds
+PERMANENT_HTTP_ERRORS = {400, 401, 403, 404, 410}  # not retried
+BULK_WRITE_BATCH_SIZE = 1000  # ops per bulk_write round-trip
+WIDE_DOC_BATCH_SIZE = 100  # smaller batches for player/coach detail docs with full stat tables
+
+# Team abbreviation from a schedule link such as /teams/BOS/1950.html
+TEAM_HREF_RE = re.compile(r'/teams/([^/]+)/')
+
+# Birth dates are stored as YYYY-MM-DD strings exactly as the index page shows them
+ISO_DATE_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])$')
+
+# Only build the parts of each page we actually read
+TEAMS_TABLE = SoupStrainer("table", id="teams_active")
+PLAYERS_TABLE = SoupStrainer("table", id="players")
+SCHEDULE_TABLE = SoupStrainer("table", id="schedule")
+COACHES_TABLE = SoupStrainer("table", id="coaches")
+MONTH_FILTER = SoupStrainer("div", class_="filter")
 
 # Helper functions
 def convert_height(height_str):
@@ -61,38 +147,164 @@ def convert_height(height_str):
     except:
         return None
 
-def safe_request(url, retries=5):
+def row_cells(row):
+    """Map each cell's data-stat to the cell in a single pass over the row"""
+    return {cell.get('data-stat'): cell for cell in row.find_all(['th', 'td'])}
+
+@lru_cache(maxsize=None)
+def parse_game_date(text):
+    """Parse a schedule date like 'Tue, Oct 22, 2024' (many games share each date)"""
+    return datetime.strptime(text, "%a, %b %d, %Y")
+
+def team_from_href(href):
+    """Extract the upper-cased team abbreviation from a /teams/... link"""
+    return TEAM_HREF_RE.search(href).group(1).upper()
+
+def bulk_upsert(collection, ops, batch_size=BULK_WRITE_BATCH_SIZE):
+    """Send UpdateOne ops to MongoDB in unordered bulk_write batches"""
+    for i in range(0, len(ops), batch_size):
+        collection.bulk_write(ops[i:i + batch_size], ordered=False)
+
+async def bulk_writer(collection, queue, batch_size=WIDE_DOC_BATCH_SIZE):
+    """
+    Single writer for a collection: drain UpdateOne ops from the queue and
+    flush them in batches until a None sentinel arrives.
+    """
+    ops = []
+    while True:
+        op = await queue.get()
+        if op is not None:
+            ops.append(op)
+        if ops and (op is None or len(ops) >= batch_size):
+            try:
+                await asyncio.to_thread(collection.bulk_write, ops, ordered=False)
+            except Exception as e:
+                print(f"Bulk write to {collection.name} failed: {e}")
+            ops = []
+        if op is None:
+            return
+
+def get_parse_pool():
+    """Process pool that HTML parsing is offloaded to, created on first use"""
+    global parse_pool
+    if parse_pool is None:
+        parse_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return parse_pool
+
+async def run_in_parse_pool(func, *args):
+    """Run a pure parse function on the process pool without blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(get_parse_pool(), func, *args)
+
+async def fetch_text(session, url, cache=False):
+    """
+    safe_request memoized per URL for the current run. Concurrent callers
+    for the same URL share one fetch; failed fetches are not remembered.
+    Pass cache=True only for pages that no longer change.
+    """
+    if url in fetched_pages:
+        fetched_pages.move_to_end(url)
+    else:
+        fetched_pages[url] = asyncio.ensure_future(safe_request(session, url, cache=cache))
+        if len(fetched_pages) > PAGE_MEMO_SIZE:
+            fetched_pages.popitem(last=False)
+
+    task = fetched_pages[url]
+    html = await task
+    if html is None and fetched_pages.get(url) is task:
+        del fetched_pages[url]
+    return html
+
+def create_session():
+    """
+    Create the aiohttp session used for scraping.
+    Cloudscraper solves any JS challenge once up front and its cookies are
+    copied into the session. Must be called from inside the event loop.
+    """
+    try:
+        scraper.get(f"{BASE_URL}/", headers=get_headers(), timeout=10)
+    except Exception as e:
+        print(f"Could not prefetch cookies: {e}")
+
+    session = aiohttp.ClientSession(
+        # Keep idle connections open so TLS handshakes are reused across the run
+        connector=aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENT_REQUESTS, keepalive_timeout=60),
+        timeout=aiohttp.ClientTimeout(total=30)
+    )
+    session.cookie_jar.update_cookies(scraper.cookies.get_dict())
+    return session
+
+def page_cache_path(url):
+    """Path of the cached copy of a page, keyed by the sha1 of its URL"""
+    return os.path.join(PAGE_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + ".html")
+
+def read_cached_page(url):
+    """Return a cached page's HTML if it exists and hasn't expired"""
+    path = page_cache_path(url)
+    try:
+        if time.time() - os.path.getmtime(path) < PAGE_CACHE_TTL:
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+    except OSError:
+        pass
+    return None
+
+def write_cached_page(url, html):
+    """Store a page's HTML in the on-disk cache"""
+    try:
+        os.makedirs(PAGE_CACHE_DIR, exist_ok=True)
+        path = page_cache_path(url)
+        # Write then rename, so a killed run never leaves a truncated page that reads as a hit
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"Could not cache {url}: {e}")
+
+async def safe_request(session, url, retries=5, cache=False):
+    """Fetch a page's HTML, backing off exponentially on 429s and errors."""
+    if cache:
+        html = read_cached_page(url)
+        if html is not None:
+            return html
+
     wait_time = 240
     for attempt in range(retries):
         try:
-            response = scraper.get(url, headers=get_headers(), timeout=10)
-            if response.status_code == 429:
-                print(f"429 Too Many Requests. Backing off for {wait_time} seconds...")
-                time.sleep(wait_time)
-                wait_time *= 2
-                continue
-            response.raise_for_status()
-            return response
+            async with request_slots:
+                async with session.get(url, headers=get_headers()) as response:
+                    if response.status in PERMANENT_HTTP_ERRORS:
+                        # Retrying won't change the answer (e.g. a season or coach page that doesn't exist)
+                        print(f"{response.status} for {url}. Skipping URL.")
+                        return None
+                    if response.status != 429:
+                        response.raise_for_status()
+                        html = await response.text()
+                        if cache:
+                            write_cached_page(url, html)
+                        return html
+            print(f"429 Too Many Requests. Backing off for {wait_time} seconds...")
         except Exception as e:
             print(f"Request failed: {e}")
-            time.sleep(wait_time)
-            wait_time *= 2
+        await asyncio.sleep(wait_time)
+        wait_time = min(wait_time * 2, MAX_BACKOFF)
     print("Max retries reached. Skipping URL.")
     return None
-def scrape_teams():
-    url = "https://www.basketball-reference.com/teams/"
-    response = safe_request(url)
-    if not response:
+
+async def scrape_teams(session):
+    url = f"{BASE_URL}/teams/"
+    html = await fetch_text(session, url)
+    if not html:
         return []
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(html, 'lxml', parse_only=TEAMS_TABLE)
     teams = []
 
     #print(soup.select('table#teams_active tbody tr:not(.thead)'))  # Debugging line to see the first 500 characters of the HTML
 
     # Use the 'teams' table which includes all franchises
     for row in soup.select('table#teams_active tbody tr:not(.thead)'):
-        team_name_cell = row.find('th', {'data-stat': 'franch_name'})
+        cells = row_cells(row)
+        team_name_cell = cells.get('franch_name')
         if not team_name_cell:
             continue
 
@@ -102,7 +314,7 @@ def scrape_teams():
         city = ' '.join(team_name.split()[:-1])
 
         def get_stat(stat_name):
-            cell = row.find('td', {'data-stat': stat_name})
+            cell = cells.get(stat_name)
             return cell.text.strip() if cell else None
 
         year_min = get_stat('year_min')
@@ -132,117 +344,85 @@ def scrape_teams():
 
 
 
-def scrape_players():
-    """Scrape all players in Basketball Reference history (~4,000)."""
-    base_url = "https://www.basketball-reference.com/players/"
+def parse_players_page(html):
+    """Parse one letter page of the player index."""
     players = []
+    soup = BeautifulSoup(html, 'lxml', parse_only=PLAYERS_TABLE)
+    table = soup.find('table', {'id': 'players'})
 
-    for letter in string.ascii_lowercase:
-        url = f"{base_url}{letter}/"
-        print(f"Scraping players starting with '{letter.upper()}'...")
-        response = safe_request(url)
-        if not response:
+    if not table:
+        return players
+
+    for row in table.select('tbody tr'):
+        # Some rows are headers for decades — skip them
+        if 'class' in row.attrs and 'thead' in row.attrs['class']:
             continue
         
-        soup = BeautifulSoup(response.text, 'html.parser')
-        table = soup.find('table', {'id': 'players'})
+        try:
+            cells = row_cells(row)
+            name_cell = cells.get('player')
+            if not name_cell or not name_cell.a:
+                continue
 
-        if not table:
-            continue
+            full_name = name_cell.a.text.strip()
+            name_parts = full_name.split()
+            first_name = ' '.join(name_parts[:-1])
+            last_name = name_parts[-1] if name_parts else ''
 
-        for row in table.select('tbody tr'):
-            # Some rows are headers for decades — skip them
-            if 'class' in row.attrs and 'thead' in row.attrs['class']:
-                continue
-            
-            try:
-                name_cell = row.find('th', {'data-stat': 'player'})
-                if not name_cell or not name_cell.a:
-                    continue
+            birth_cell = cells.get('birth_date')
+            birth_text = birth_cell.text.strip() if birth_cell else ''
 
-                full_name = name_cell.a.text.strip()
-                name_parts = full_name.split()
-                first_name = ' '.join(name_parts[:-1])
-                last_name = name_parts[-1] if name_parts else ''
-
-                birth_date = None
-                birth_cell = row.find('td', {'data-stat': 'birth_date'})
-                if birth_cell and birth_cell.text.strip():
-                    try:
-                        birth_date = datetime.strptime(birth_cell.text.strip(), '%Y-%m-%d').date()
-                    except ValueError:
-                        pass
-
-                players.append({
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'birth_date': birth_date.isoformat() if birth_date else None,
-                    'player_url': "https://www.basketball-reference.com" + name_cell.a['href']
-                })
-            except Exception as e:
-                print(f"Error processing row: {e}")
+            players.append({
+                'first_name': first_name,
+                'last_name': last_name,
+                'birth_date': birth_text if ISO_DATE_RE.match(birth_text) else None,
+                'player_url': BASE_URL + name_cell.a['href']
+            })
+        except Exception as e:
+            print(f"Error processing row: {e}")
 
-    print(f"Total players scraped: {len(players)}")
     return players
 
-def scrape_player_details(player):
+async def scrape_players(session):
+    """
+    Scrape all players in Basketball Reference history (~4,000).
+    Yields each letter page's players as soon as it is parsed, so callers can write as they go
+    (in a worker thread, so the other letter pages keep downloading meanwhile).
+    """
+    async def scrape_letter(letter):
+        print(f"Scraping players starting with '{letter.upper()}'...")
+        html = await fetch_text(session, f"{BASE_URL}/players/{letter}/")
+        return parse_players_page(html) if html else []
+
+    total = 0
+    for page in asyncio.as_completed([scrape_letter(letter) for letter in string.ascii_lowercase]):
+        players = await page
+        total += len(players)
+        yield players
+
+    print(f"Total players scraped: {total}")
+
+async def scrape_player_details(session, player):
     """
-    Given a player document with 'player_url',
-    scrapes every available table & stat from their Basketball Reference page.
-    Missing data is stored as None.
+    Given a player document with 'player_url', fetch their Basketball Reference
+    page and parse it in the parse pool.
     """
+    full_name = f"{player.get('first_name', '')} {player.get('last_name', '')}".strip()
     try:
         url = player.get("player_url")
         if not url:
-            print(f"No player_url for {player.get('first_name', '')} {player.get('last_name', '')}")
+            print(f"No player_url for {full_name}")
             return None
 
-        response = safe_request(url)
-        if not response:
+        html = await fetch_text(session, url)
+        if not html:
             print(f"Failed to fetch {url}")
             return None
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        details = {
-            "full_name": f"{player.get('first_name', '')} {player.get('last_name', '')}".strip(),
-            "bio": {},
-            "stats": {}
-        }
-
-        # === Bio / Metadata extraction ===
-        meta = soup.find('div', {'id': 'meta'})
-        if meta:
-            for p in meta.find_all('p'):
-                text = p.get_text(" ", strip=True)
-                if ':' in text:
-                    key, value = text.split(':', 1)
-                    details["bio"][key.strip()] = value.strip()
-        else:
-            details["bio"] = None
-
-        # === Extract ALL tables dynamically ===
-        tables = soup.find_all('table')
-        for table in tables:
-            table_id = table.get('id', 'unknown_table')
-            headers = [th.get_text(strip=True) for th in table.find_all('th')]
-            rows_data = []
-
-            for row in table.find_all('tr'):
-                if row.get('class') and 'thead' in row.get('class'):
-                    continue
-                row_values = [cell.get_text(strip=True) or None for cell in row.find_all(['th', 'td'])]
-                rows_data.append(row_values)
-
-            details["stats"][table_id] = {
-                "headers": headers,
-                "rows": rows_data if rows_data else None
-            }
-
-        return details
+        return await run_in_parse_pool(parse_player_details, html, full_name)
 
     except Exception as e:
-        print(f"Error scraping details for {player.get('first_name', '')} {player.get('last_name', '')}: {e}")
+        print(f"Error scraping details for {full_name}: {e}")
         return None
 
 
@@ -250,110 +430,186 @@ def update_player_details(player_id, details):
     """Update a single player's details in MongoDB."""
     players_collection.update_one(
         {"_id": player_id},
-        {"$set": {"details": details}}
+        {"$set": {"details": details}, "$currentDate": {"last_modified": True}}
     )
 
 
-def scrape_all_player_details():
-    players = players_collection.find({
+async def scrape_all_player_details(session, batch_size=64):
+    query = {
         "$or": [
             {"details": {"$exists": False}},
             {"details": None}
         ]
-    })
-    for player in players:
+    }
+    # Resume after the last fully scraped batch if a previous run was interrupted
+    checkpoint = progress_collection.find_one({"_id": "player_details"})
+    if checkpoint:
+        print(f"Resuming player details after {checkpoint['last_scraped_id']}")
+        query["_id"] = {"$gt": checkpoint["last_scraped_id"]}
+
+    players = players_collection.find(query, no_cursor_timeout=True, batch_size=batch_size).sort("_id")
+
+    async def scrape_one(player):
+        """The UpdateOne storing a player's details, or None if they couldn't be scraped"""
         try:
             print(f"Scraping details for {player.get('first_name')} {player.get('last_name')}...")
-            details = scrape_player_details(player)
+            details = await scrape_player_details(session, player)
             if details:
-                players_collection.update_one(
+                print(f"Successfully scraped details for {player.get('first_name')} {player.get('last_name')}")
+                return UpdateOne(
                     {"_id": player["_id"]},
-                    {"$set": {"details": details}}
+                    {"$set": {"details": details}, "$currentDate": {"last_modified": True}}
                 )
-            print(f"Successfully scraped details for {player.get('first_name')} {player.get('last_name')}")
         except Exception as e:
             print(f"Error scraping details for {player.get('first_name')} {player.get('last_name')}: {e}")
+        return None
 
+    async def scrape_batch(batch):
+        ops = [op for op in await asyncio.gather(*(scrape_one(p) for p in batch)) if op]
+        # Write the batch before checkpointing it, so the checkpoint never runs ahead of the writes
+        if ops:
+            await asyncio.to_thread(bulk_upsert, players_collection, ops, WIDE_DOC_BATCH_SIZE)
+        await asyncio.to_thread(
+            progress_collection.update_one,
+            {"_id": "player_details"},
+            {"$set": {"last_scraped_id": batch[-1]["_id"]}},
+            upsert=True
+        )
 
-def scrape_and_upsert_schedule(start_year=1947, end_year=datetime.now().year):
+    # Scrape in batches so the cursor is consumed as we go rather than loaded up front
+    try:
+        batch = []
+        for player in players:
+            batch.append(player)
+            if len(batch) >= batch_size:
+                await scrape_batch(batch)
+                batch = []
+        if batch:
+            await scrape_batch(batch)
+    finally:
+        players.close()
+
+    # Full pass done; the next run rescans for players that still lack details
+    progress_collection.delete_one({"_id": "player_details"})
+
+
+async def scrape_and_upsert_schedule(session, start_year=1947, end_year=datetime.now().year):
     """
     Scrape NBA/BAA schedules from start_year to end_year and upsert into MongoDB.
-    Handles the BAA prefix for 1947–1949.
+    Handles the BAA prefix for 1947–1949. Seasons and their month pages are fetched concurrently.
     """
-    for year in range(start_year, end_year + 1):
-        prefix = "BAA" if year < 1950 else "NBA"
-        print(f"Scraping {prefix} {year} schedule...")
+    await asyncio.gather(*(scrape_season_schedule(session, year) for year in range(start_year, end_year + 1)))
+    print("All available seasons scraped and upserted successfully.")
 
-        season_url = f"https://www.basketball-reference.com/leagues/{prefix}_{year}_games.html"
 
-        try:
-            response = safe_request(season_url)
-            if not response:
-                print(f"Could not fetch {season_url}, skipping...")
-                continue
-        except Exception as e:
-            print(f"Skipping {year}: {e}")
-            continue
+def season_is_stored(year):
+    """True if every month page of the season was upserted and none of its games lacks a score"""
+    return (
+        progress_collection.count_documents({"_id": f"schedule_{year}"}, limit=1) > 0
+        and games_collection.count_documents({"season": year, "home_score": None}, limit=1) == 0
+    )
 
-        soup = BeautifulSoup(response.text, "html.parser")
 
-        # Find all month links dynamically
-        month_links = [
-            a['href']
-            for a in soup.select("div#content div.filter a")
-            if a['href'].endswith(".html")
-        ]
+async def scrape_season_schedule(session, year):
+    """Scrape and upsert every month page of one season's schedule."""
+    prefix = "BAA" if year < 1950 else "NBA"
+    # Finished seasons never change, so their pages can come from the disk cache
+    finished = year < datetime.now().year
 
-        for link in month_links:
-            month_url = f"https://www.basketball-reference.com{link}"
+    # ...and any already stored in full can be skipped outright
+    if finished and await asyncio.to_thread(season_is_stored, year):
+        print(f"{prefix} {year} schedule already stored, skipping...")
+        return
+
+    print(f"Scraping {prefix} {year} schedule...")
+
+    season_url = f"{BASE_URL}/leagues/{prefix}_{year}_games.html"
+
+    try:
+        html = await fetch_text(session, season_url, cache=finished)
+        if not html:
+            print(f"Could not fetch {season_url}, skipping...")
+            return
+    except Exception as e:
+        print(f"Skipping {year}: {e}")
+        return
+
+    soup = BeautifulSoup(html, "lxml", parse_only=MONTH_FILTER)
+
+    # Find all month links dynamically
+    month_links = [
+        a['href']
+        for a in soup.select("div.filter a")
+        if a['href'].endswith(".html")
+    ]
+
+    stored = await asyncio.gather(*(
+        scrape_schedule_month(session, f"{BASE_URL}{link}", year, prefix, cache=finished) for link in month_links
+    ))
+
+    # Remember seasons whose month pages all made it, so later runs can skip them
+    if month_links and all(stored):
+        await asyncio.to_thread(
+            progress_collection.update_one,
+            {"_id": f"schedule_{year}"},
+            {"$set": {"months": len(month_links)}, "$currentDate": {"completed_at": True}},
+            upsert=True
+        )
+
+
+async def scrape_schedule_month(session, month_url, year, prefix, cache=False):
+    """Scrape one month page of a season's schedule and upsert its games. Returns True on success."""
+    try:
+        month_html = await fetch_text(session, month_url, cache=cache)
+        if not month_html:
+            return False
+        month_soup = BeautifulSoup(month_html, "lxml", parse_only=SCHEDULE_TABLE)
+        ops = []
+
+        for row in month_soup.select("table#schedule tbody tr"):
             try:
-                month_response = safe_request(month_url)
-                if not month_response:
+                cells = row_cells(row)
+                date_cell = cells.get("date_game")
+                if not date_cell:
                     continue
-                month_soup = BeautifulSoup(month_response.text, "html.parser")
-
-                for row in month_soup.select("table#schedule tbody tr"):
-                    try:
-                        date_cell = row.find("th", {"data-stat": "date_game"})
-                        if not date_cell:
-                            continue
-
-                        away_team = row.find("td", {"data-stat": "visitor_team_name"}).find("a")["href"].split("/")[2].upper()
-                        home_team = row.find("td", {"data-stat": "home_team_name"}).find("a")["href"].split("/")[2].upper()
-
-                        away_score = row.find("td", {"data-stat": "visitor_pts"}).text
-                        home_score = row.find("td", {"data-stat": "home_pts"}).text
-
-                        game_data = {
-                            "date": datetime.strptime(date_cell.text, "%a, %b %d, %Y"),  # full datetime
-                            "away_team": away_team,
-                            "home_team": home_team,
-                            "away_score": int(away_score) if away_score else None,
-                            "home_score": int(home_score) if home_score else None,
-                            "season": year,
-                            "league": prefix
-                        }
-
-
-                        # Upsert game
-                        games_collection.update_one(
-                            {
-                                "date": game_data["date"],
-                                "away_team": game_data["away_team"],
-                                "home_team": game_data["home_team"]
-                            },
-                            {"$set": game_data},
-                            upsert=True
-                        )
-
-                    except Exception as e:
-                        print(f"Skipping malformed row in {month_url}: {e}")
-                        continue
+
+                away_team = team_from_href(cells["visitor_team_name"].a["href"])
+                home_team = team_from_href(cells["home_team_name"].a["href"])
+
+                away_score = cells["visitor_pts"].text
+                home_score = cells["home_pts"].text
+
+                game_data = {
+                    "date": parse_game_date(date_cell.text),  # full datetime
+                    "away_team": away_team,
+                    "home_team": home_team,
+                    "away_score": int(away_score) if away_score else None,
+                    "home_score": int(home_score) if home_score else None,
+                    "season": year,
+                    "league": prefix
+                }
+
+
+                ops.append(UpdateOne(
+                    {
+                        "date": game_data["date"],
+                        "away_team": game_data["away_team"],
+                        "home_team": game_data["home_team"]
+                    },
+                    {"$set": game_data, "$currentDate": {"last_modified": True}},
+                    upsert=True
+                ))
+
             except Exception as e:
-                print(f"Skipping month page {month_url}: {e}")
+                print(f"Skipping malformed row in {month_url}: {e}")
                 continue
 
-    print("All available seasons scraped and upserted successfully.")
+        # One round-trip per month page, off the event loop so other fetches keep going
+        await asyncio.to_thread(bulk_upsert, games_collection, ops)
+        return True
+    except Exception as e:
+        print(f"Skipping month page {month_url}: {e}")
+        return False
 
 
 
@@ -361,138 +617,109 @@ def scrape_and_upsert_schedule(start_year=1947, end_year=datetime.now().year):
 
 def insert_teams(teams):
     print("Upserting teams into MongoDB...")
-    for team in teams:
-        teams_collection.update_one(
+    bulk_upsert(teams_collection, [
+        UpdateOne(
             {"abbreviation": team["abbreviation"]},
-            {"$set": team},
+            {"$set": team, "$currentDate": {"last_modified": True}},
             upsert=True
         )
+        for team in teams
+    ])
 
 
 
 def insert_players(players):
     print(f"Upserting {len(players)} players into MongoDB...")
+    ops = []
     for player in players:
         # Convert birth_date to ISO string if it's a date
         if isinstance(player.get("birth_date"), date):
             player["birth_date"] = player["birth_date"].isoformat()
 
-        players_collection.update_one(
+        ops.append(UpdateOne(
             {
                 "first_name": player["first_name"],
                 "last_name": player["last_name"],
                 "birth_date": player["birth_date"]
             },
-            {"$set": player},
+            {"$set": player, "$currentDate": {"last_modified": True}},
             upsert=True
-        )
+        ))
+    bulk_upsert(players_collection, ops)
 
 
 def insert_games(games):
     print(f"Upserting {len(games)} games into MongoDB...")
+    ops = []
     for game in games:
         if isinstance(game.get("date"), date):
             game["date"] = game["date"].isoformat()
 
-        games_collection.update_one(
+        ops.append(UpdateOne(
             {
                 "date": game["date"],
                 "home_team": game["home_team"],
                 "away_team": game["away_team"]
             },
-            {"$set": game},
+            {"$set": game, "$currentDate": {"last_modified": True}},
             upsert=True
-        )
+        ))
+    bulk_upsert(games_collection, ops)
 
 
 
-def scrape_coach_details(coach_url, coach_name):
+async def scrape_coach_details(session, coach_url, coach_name):
     """Scrape details for a single coach given their Basketball Reference URL."""
-    response = safe_request(coach_url)
-    if not response:
+    html = await fetch_text(session, coach_url)
+    if not html:
         return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    details = {
-        "full_name": coach_name,
-        "url": coach_url,
-        "bio": {},
-        "stats": {}
-    }
-
-    # === Bio / Meta (similar to players) ===
-    meta = soup.find("div", {"id": "meta"})
-    if meta:
-        for p in meta.find_all("p"):
-            text = p.get_text(" ", strip=True)
-            if ":" in text:
-                key, value = text.split(":", 1)
-                details["bio"][key.strip()] = value.strip()
-    else:
-        details["bio"] = None
-
-    # === Coaching tables ===
-    tables = soup.find_all("table")
-    for table in tables:
-        table_id = table.get("id", "unknown_table")
-        headers = [th.get_text(strip=True) for th in table.find_all("th")]
-        rows_data = []
-
-        for row in table.find_all("tr"):
-            if row.get("class") and "thead" in row.get("class"):
-                continue
-            row_values = []
-            for cell in row.find_all(["th", "td"]):
-                val = cell.get_text(strip=True)
-                row_values.append(val if val != "" else None)
-            if any(row_values):
-                rows_data.append(row_values)
-
-        details["stats"][table_id] = {
-            "headers": headers,
-            "rows": rows_data if rows_data else None
-        }
-
-    return details
+    return await run_in_parse_pool(parse_coach_details, html, coach_url, coach_name)
 
 
-def scrape_all_coaches(db):
+async def scrape_all_coaches(session, db):
     """Scrape all coaches from Basketball Reference index page and upsert into MongoDB."""
     coaches_collection = db['coaches']
-    index_url = "https://www.basketball-reference.com/coaches/"
-    response = safe_request(index_url)
-    if not response:
+    index_url = f"{BASE_URL}/coaches/"
+    html = await fetch_text(session, index_url)
+    if not html:
         print("Failed to fetch coaches index page.")
         return
 
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = BeautifulSoup(html, "lxml", parse_only=COACHES_TABLE)
     coach_links = soup.select("table#coaches a")
 
-    for link in coach_links:
+    write_queue = asyncio.Queue()
+    writer = asyncio.create_task(bulk_writer(coaches_collection, write_queue))
+
+    async def scrape_coach(link):
         coach_name = link.text.strip()
-        coach_url = f"https://www.basketball-reference.com{link['href']}"
+        coach_url = f"{BASE_URL}{link['href']}"
 
         try:
-            details = scrape_coach_details(coach_url, coach_name)
+            details = await scrape_coach_details(session, coach_url, coach_name)
             if details:
-                coaches_collection.update_one(
+                print(f"✅ Scraped {coach_name}")
+                await write_queue.put(UpdateOne(
                     {"url": coach_url},
-                    {"$set": details},
+                    {"$set": details, "$currentDate": {"last_modified": True}},
                     upsert=True
-                )
-                print(f"✅ Scraped {coach_name}")
+                ))
         except Exception as e:
             print(f"Error scraping {coach_name}: {e}")
-            continue
+
+    await asyncio.gather(*(scrape_coach(link) for link in coach_links))
+    await write_queue.put(None)
+    await writer
 
     print("Finished scraping all coaches.")
 
 # Main execution
-def main():
-    try:
+async def main():
+    async with create_session() as session:
         # Scrape and insert teams
         '''try:
-            teams = scrape_teams()
+            teams = await scrape_teams(session)
             if teams:
                 insert_teams(teams)
         except Exception as e:
@@ -500,9 +727,10 @@ def main():
 
         '''# Scrape and insert players
         '''try:
-            players = scrape_players()
-            if players:
-                insert_players(players)  # No team_id needed now
+            async for players in scrape_players(session):
+                if players:
+                    # Written off the event loop so the remaining letter pages keep downloading
+                    await asyncio.to_thread(insert_players, players)  # No team_id needed now
         except Exception as e:
             print(f"Error scraping/inserting players: {e}")
 
@@ -510,7 +738,7 @@ def main():
         
         '''while True:
             try:
-                scrape_all_player_details()
+                await scrape_all_player_details(session)
                 break  # exit if finished successfully
             except pymongo.errors.CursorNotFound as e:
                 print(f"CursorNotFound — restarting scrape: {e}")
@@ -521,7 +749,7 @@ def main():
         '''
         # Scrape and insert games
         '''try:
-            games = scrape_and_upsert_schedule()
+            games = await scrape_and_upsert_schedule(session)
             if games:
                 insert_games(games)
         except Exception as e:
@@ -529,16 +757,19 @@ def main():
         '''
         try:
             print("\n=== Scraping Coaches ===")
-            scrape_all_coaches(db)
+            await scrape_all_coaches(session, db)
         except Exception as e:
             print(f"Error scraping coaches: {e}")
     
         
         print("Database population completed successfully.")
-        
-    except Exception as e:
-        print(f"Fatal error: {e}")
+
+    if parse_pool is not None:
+        parse_pool.shutdown()
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        print(f"Fatal error: {e}")
@@ -1,12 +1,13 @@
 from pymongo import MongoClient
 import json
 
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pymongo import MongoClient
 from datetime import datetime
 import urllib.parse
 import json
 import logging
+import re
 
 hostName = "localhost"
 serverPort = 8080
@@ -15,24 +16,27 @@ mongo_client = MongoClient("mongodb://localhost:27017/")
 db = mongo_client["your_database_name"]       # <--- change
 collection = db["your_collection_name"]       # <--- change
 
+OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
 def search_mongodb(query):
-    cursor = collection.find(
-        {"$text": {"$search": query}},
-        {"score": {"$meta": "textScore"}, "title": 1, "content": 1}
-    ).sort([("score", {"$meta": "textScore"})]).limit(10)
-    
-    results = []
-    for doc in cursor:
-        snippet = doc.get("content", [""])[0] if "content" in doc and len(doc["content"]) > 0 else ""
-        results.append({
-            "id": str(doc["_id"]),
-            "title": doc.get("title", ""),
-            "snippet": snippet
-        })
-    return results
+    # Rank, trim and reshape server-side so only the 10 final results cross the wire
+    return list(collection.aggregate([
+        {"$match": {"$text": {"$search": query}}},
+        {"$sort": {"score": {"$meta": "textScore"}}},
+        {"$limit": 10},
+        {"$project": {
+            "_id": 0,
+            "id": {"$toString": "$_id"},
+            "title": {"$ifNull": ["$title", ""]},
+            "snippet": {"$ifNull": [{"$arrayElemAt": ["$content", 0]}, ""]}
+        }}
+    ]))
 
 def get_document(doc_id):
     from bson.objectid import ObjectId
+    # Reject malformed ids before building an ObjectId or querying Mongo
+    if not OID_RE.fullmatch(doc_id):
+        return None
     try:
         doc = collection.find_one({"_id": ObjectId(doc_id)})
         if not doc:
@@ -98,7 +102,8 @@ class MyServer(BaseHTTPRequestHandler):
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
     logging.info(f"Starting server at http://{hostName}:{serverPort}")
-    webServer = HTTPServer((hostName, serverPort), MyServer)
+    # One thread per request so slow Mongo queries don't serialize other requests
+    webServer = ThreadingHTTPServer((hostName, serverPort), MyServer)
     try:
         webServer.serve_forever()
     except KeyboardInterrupt:
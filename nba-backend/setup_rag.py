@@ -10,6 +10,7 @@ import sys
 from dotenv import load_dotenv
 from rag_system import NBARAGAgent
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 def check_environment():
     """Check if all required environment variables are set"""
@@ -50,15 +51,13 @@ def check_data_availability():
     try:
         from pymongo import MongoClient
         mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-        client = MongoClient(mongo_uri)
+        client = MongoClient(mongo_uri, maxPoolSize=8)
         db = client["nba_stats"]
         
-        collections = {
-            'teams': db.teams.count_documents({}),
-            'players': db.players.count_documents({}),
-            'games': db.games.count_documents({}),
-            'coaches': db.coaches.count_documents({})
-        }
+        # Collection metadata counts, fetched concurrently; no scan needed just to check data exists
+        names = ['teams', 'players', 'games', 'coaches']
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            collections = dict(zip(names, executor.map(lambda name: db[name].estimated_document_count(), names)))
         
         print("📊 Data availability in MongoDB:")
         for collection, count in collections.items():
@@ -3,239 +3,191 @@
 Quick RAG System Test Script
 
 This script tests if your RAG system is working properly.
-Run this to verify everything is set up correctly.
+Run this to verify everything is set up correctly:
+
+    pytest test_rag.py        (or: python test_rag.py)
+
+pytest.ini runs the tests in parallel with pytest-xdist (-n auto); add -s to see their output.
 """
 
 import os
+import json
 import sys
+import tempfile
+import asyncio
+import importlib.util
+import pytest
 from dotenv import load_dotenv
 
+# Read .env once for the whole suite
+load_dotenv()
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+MONGODB_URI = os.getenv("MONGODB_URI")
+MONGO_URI = MONGODB_URI or "mongodb://localhost:27017/"
+
+# Let the fast tokenizer use all cores when the corpus is embedded (must be set before it loads)
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "true")
+
+# Fail fast on an unreachable cluster instead of waiting out the 30s default
+MONGO_CLIENT_OPTIONS = {"maxPoolSize": 8, "serverSelectionTimeoutMS": 2000, "connectTimeoutMS": 2000}
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nba-backend')
+
+API_BASE_URL = "http://localhost:8000"
+# The API test's request body, serialized once
+API_PAYLOAD = json.dumps({"query": "How many teams are in the NBA?"}).encode("utf-8")
+API_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+@pytest.fixture(scope="session")
+def mongo_client():
+    """MongoClient shared across the session by the synchronous tests (one per xdist worker)"""
+    from pymongo import MongoClient
+    client = MongoClient(MONGO_URI, **MONGO_CLIENT_OPTIONS)
+    yield client
+    client.close()
+
+@pytest.fixture(scope="session")
+def api_session():
+    """Keep-alive HTTP session shared by every API call, so sockets are reused"""
+    requests = pytest.importorskip("requests")
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    yield session
+    session.close()
+
 def test_imports():
-    """Test if all required packages can be imported"""
+    """Test if all required packages are installed"""
     print("🔍 Testing imports...")
-    
-    try:
-        import openai
-        print("✅ OpenAI imported successfully")
-    except ImportError as e:
-        print(f"❌ OpenAI import failed: {e}")
-        return False
-    
-    try:
-        import pymongo
-        print("✅ PyMongo imported successfully")
-    except ImportError as e:
-        print(f"❌ PyMongo import failed: {e}")
-        return False
-    
-    try:
-        import sentence_transformers
-        print("✅ Sentence Transformers imported successfully")
-    except ImportError as e:
-        print(f"❌ Sentence Transformers import failed: {e}")
-        return False
-    
-    try:
-        import faiss
-        print("✅ FAISS imported successfully")
-    except ImportError as e:
-        print(f"❌ FAISS import failed: {e}")
-        return False
-    
-    try:
-        import numpy
-        print("✅ NumPy imported successfully")
-    except ImportError as e:
-        print(f"❌ NumPy import failed: {e}")
-        return False
-    
-    return True
+
+    # find_spec only locates each package; nothing is imported (sentence_transformers would pull in torch)
+    packages = [
+        ("openai", "OpenAI"),
+        ("pymongo", "PyMongo"),
+        ("sentence_transformers", "Sentence Transformers"),
+        ("faiss", "FAISS"),
+        ("numpy", "NumPy")
+    ]
+
+    missing = [display_name for module_name, display_name in packages
+               if importlib.util.find_spec(module_name) is None]
+    assert not missing, f"Not installed: {', '.join(missing)}"
+    print("✅ All required packages are installed")
 
 def test_environment():
     """Test environment variables"""
     print("\n🔧 Testing environment variables...")
-    
-    load_dotenv()
-    
-    openai_key = os.getenv("OPENAI_API_KEY")
-    mongodb_uri = os.getenv("MONGODB_URI")
-    
-    if not openai_key or openai_key == "your_openai_api_key_here":
-        print("❌ OPENAI_API_KEY not set or using placeholder")
-        return False
-    else:
-        print("✅ OPENAI_API_KEY is set")
-    
-    if not mongodb_uri:
-        print("❌ MONGODB_URI not set")
-        return False
-    else:
-        print(f"✅ MONGODB_URI is set: {mongodb_uri}")
-    
-    return True
 
-def test_mongodb():
-    """Test MongoDB connection and data"""
-    print("\n🗄️  Testing MongoDB connection...")
-    
+    assert OPENAI_API_KEY and OPENAI_API_KEY != "your_openai_api_key_here", \
+        "OPENAI_API_KEY not set or using placeholder"
+    print("✅ OPENAI_API_KEY is set")
+
+    assert MONGODB_URI, "MONGODB_URI not set"
+    print(f"✅ MONGODB_URI is set: {MONGODB_URI}")
+
+async def fetch_collection_counts(collections):
+    """Ping the server, then fetch each collection's document count concurrently"""
+    from pymongo import AsyncMongoClient
+
+    client = AsyncMongoClient(MONGO_URI, **MONGO_CLIENT_OPTIONS)
     try:
-        from pymongo import MongoClient
-        load_dotenv()
-        
-        mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-        client = MongoClient(mongo_uri)
-        
         # Test connection
-        client.admin.command('ping')
+        await client.admin.command('ping')
         print("✅ MongoDB connection successful")
-        
-        # Check data
+
+        # Metadata counts; enough to tell whether data is there
         db = client["nba_stats"]
-        collections = ['teams', 'players', 'games', 'coaches']
-        
-        total_docs = 0
-        for collection_name in collections:
-            count = db[collection_name].count_documents({})
-            total_docs += count
-            status = "✅" if count > 0 else "❌"
-            print(f"   {status} {collection_name}: {count} documents")
-        
-        if total_docs == 0:
-            print("❌ No data found in MongoDB")
-            return False
-        else:
-            print(f"✅ Total documents: {total_docs}")
-            return True
-            
-    except Exception as e:
-        print(f"❌ MongoDB test failed: {e}")
-        return False
-
-def test_rag_system():
+        return await asyncio.gather(*(db[name].estimated_document_count() for name in collections))
+    finally:
+        await client.close()
+
+def test_mongodb():
+    """Test MongoDB connection and data"""
+    print("\n🗄️  Testing MongoDB connection...")
+
+    collections = ['teams', 'players', 'games', 'coaches']
+    counts = asyncio.run(fetch_collection_counts(collections))
+
+    for collection_name, count in zip(collections, counts):
+        status = "✅" if count > 0 else "❌"
+        print(f"   {status} {collection_name}: {count} documents")
+
+    total_docs = sum(counts)
+    assert total_docs > 0, "No data found in MongoDB"
+    print(f"✅ Total documents: {total_docs}")
+
+def test_rag_system(mongo_client):
     """Test the RAG system"""
     print("\n🚀 Testing RAG system...")
-    
-    try:
-        # Import the RAG system
-        sys.path.append('nba-backend')
-        from rag_system import NBARAGAgent
-        
-        # Initialize
-        load_dotenv()
-        mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
-        openai_key = os.getenv("OPENAI_API_KEY")
-        
-        print("   Initializing RAG agent...")
-        rag_agent = NBARAGAgent(mongo_uri, openai_key)
-        
-        print("   Building vector store (this may take a moment)...")
-        rag_agent.initialize()
-        
-        print("✅ RAG system initialized successfully")
-        
-        # Test a simple query
-        print("   Testing with sample query...")
-        test_query = "How many teams are in the NBA?"
-        result = rag_agent.analyze(test_query)
-        
-        if result and 'analysis' in result:
-            print(f"✅ Query test successful!")
-            print(f"   Query: {test_query}")
-            print(f"   Response: {result['analysis'][:100]}...")
-            print(f"   Sources used: {len(result['sources'])}")
-            return True
-        else:
-            print("❌ Query test failed - no analysis returned")
-            return False
-            
-    except Exception as e:
-        print(f"❌ RAG system test failed: {e}")
-        return False
-
-def test_api_endpoint():
+
+    # Import the RAG system (only touch sys.path if it hasn't been imported yet)
+    if 'rag_system' not in sys.modules:
+        sys.path.insert(0, BACKEND_DIR)
+    from rag_system import NBARAGAgent
+    import torch
+
+    # Pooling/normalization after the ONNX encoder runs in torch
+    torch.set_num_threads(os.cpu_count())
+
+    # Initialize
+    # Persist the index between test runs so only the first run has to embed the corpus
+    cache_dir = os.getenv("RAG_TEST_CACHE_DIR", os.path.join(tempfile.gettempdir(), "nba_rag_cache"))
+
+    print("   Initializing RAG agent...")
+    rag_agent = NBARAGAgent(MONGO_URI, OPENAI_API_KEY, cache_dir=cache_dir, index_type="sq8",
+                            client=mongo_client)
+
+    print(f"   Building vector store (cached in {cache_dir}; first run may take a moment)...")
+    # A couple hundred documents is plenty to exercise retrieval + generation
+    rag_agent.initialize(sample_size=200)
+
+    print("✅ RAG system initialized successfully")
+
+    # Test a simple query
+    print("   Testing with sample query...")
+    test_query = "How many teams are in the NBA?"
+    # Embed once; further runs of the same query can reuse the vector
+    query_embedding = rag_agent.embed_query(test_query)
+    result = rag_agent.analyze_embedded(query_embedding, test_query)
+
+    assert result and 'analysis' in result, "Query test failed - no analysis returned"
+    print("✅ Query test successful!")
+    print(f"   Query: {test_query}")
+    print(f"   Response: {result['analysis'][:100]}...")
+    print(f"   Sources used: {len(result['sources'])}")
+
+def test_api_endpoint(api_session):
     """Test the Flask API endpoint"""
     print("\n🌐 Testing API endpoint...")
-    
+
+    import requests
+
+    # Start the Flask app in background (simplified test)
+    print("   Note: Make sure Flask app is running on port 8000")
+    print("   You can start it with: cd nba-backend && python app.py")
+
+    # Test the endpoint
     try:
-        import requests
-        import time
-        
-        # Start the Flask app in background (simplified test)
-        print("   Note: Make sure Flask app is running on port 8000")
-        print("   You can start it with: cd nba-backend && python app.py")
-        
-        # Test the endpoint
-        try:
-            response = requests.post(
-                'http://localhost:8000/api/rag-analyze',
-                json={'query': 'How many teams are in the NBA?'},
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                print("✅ API endpoint working!")
-                print(f"   Response: {data.get('analysis', 'No analysis')[:100]}...")
-                return True
-            else:
-                print(f"❌ API returned status code: {response.status_code}")
-                return False
-                
-        except requests.exceptions.ConnectionError:
-            print("⚠️  API not running - start Flask app first")
-            return False
-            
-    except ImportError:
-        print("❌ Requests library not available")
-        return False
-    except Exception as e:
-        print(f"❌ API test failed: {e}")
-        return False
-
-def main():
-    """Run all tests"""
-    print("🏀 NBA RAG System Test Suite")
-    print("=" * 40)
-    
-    tests = [
-        ("Import Test", test_imports),
-        ("Environment Test", test_environment),
-        ("MongoDB Test", test_mongodb),
-        ("RAG System Test", test_rag_system),
-        ("API Endpoint Test", test_api_endpoint)
-    ]
-    
-    passed = 0
-    total = len(tests)
-    
-    for test_name, test_func in tests:
+        # Warm-up: opens the pooled connection before the real request
         try:
-            if test_func():
-                passed += 1
-            else:
-                print(f"❌ {test_name} FAILED")
-        except Exception as e:
-            print(f"❌ {test_name} ERROR: {e}")
-    
-    print(f"\n📊 Test Results: {passed}/{total} tests passed")
-    
-    if passed == total:
-        print("🎉 All tests passed! Your RAG system is working!")
-    elif passed >= 3:
-        print("⚠️  Most tests passed, but there are some issues to fix")
-    else:
-        print("❌ Multiple tests failed. Check the errors above.")
-    
-    print("\n💡 Next steps:")
-    if passed >= 3:
-        print("1. Start the Flask app: cd nba-backend && python app.py")
-        print("2. Start the frontend: cd nba-frontend && npm start")
-        print("3. Open http://localhost:3000 and try the RAG Analysis tab")
-    else:
-        print("1. Fix the failing tests above")
-        print("2. Make sure all dependencies are installed")
-        print("3. Check your .env file configuration")
+            api_session.get(f'{API_BASE_URL}/api/health', timeout=1)
+        except requests.exceptions.Timeout:
+            pass
 
-if __name__ == "__main__":
-    main()
+        response = api_session.post(
+            f'{API_BASE_URL}/api/rag-analyze',
+            data=API_PAYLOAD,
+            headers=API_HEADERS,
+            timeout=10
+        )
+    except requests.exceptions.ConnectionError:
+        pytest.skip("API not running - start Flask app first")
+
+    assert response.status_code == 200, f"API returned status code: {response.status_code}"
+    data = response.json()
+    print("✅ API endpoint working!")
+    print(f"   Response: {data.get('analysis', 'No analysis')[:100]}...")
 
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))